@@ -5,16 +5,28 @@ This module provides functions to initialize and configure the analogue-to-digit
 converter (ADC) interface, fetch individual or collective input channel values, and
 validate analogue channel keys. The module ensures compatibility with ADC devices
 by dynamically checking their presence and functionality at runtime.
+
+The converter is owned by a background AnalogueSampler. It runs the ADS1115 in continuous conversion mode at
+settings['analogue_data_rate'] samples per second, reads the enabled channels in turn and keeps the most recent
+settings['analogue_buffer_samples'] timestamped samples of each channel. API reads and the history are served from
+the latest sample, so a request never waits for an I2C conversion.
+
+Channel names, enables and the analogue prefix are reloaded in-process when the settings change, installing or
+removing the converter needs a restart.
 """
-from app_control import settings
+from collections import deque
+from threading import Thread, Event
+from time import time
+from app_control import settings, register_reload
 from logmanager import logger
+from timeseries_class import history
 if settings['analogue_installed']:
     import board
     from adafruit_ads1x15.ads1115 import ADS1115
+    from adafruit_ads1x15.ads1x15 import Mode
     from adafruit_ads1x15.analog_in import AnalogIn
 
 
-
 analogue_channels={}
 for interface in range(1, 5):
     analogue_channels[interface] = settings['analogue_channels'][str(interface)]
@@ -41,12 +53,68 @@ def init_analogue():
             logger.info('i2c device found at address: %s', output)
             if settings['analogue_i2c'] in output:
                 ADC_DEVICE = ADS1115(i2c, address=settings['analogue_i2c'])
+                try:
+                    ADC_DEVICE.data_rate = settings['analogue_data_rate']
+                except ValueError:
+                    logger.warning('Analogue data rate %s not supported, using %s', settings['analogue_data_rate'],
+                                   ADC_DEVICE.data_rate)
+                ADC_DEVICE.mode = Mode.CONTINUOUS
                 logger.info('Analogue to digital convertor connected')
                 return
         settings['analogue_installed'] = False
         logger.warning('Analogue to digital convertor not found')
 
 
+class AnalogueSampler:
+    """
+    Samples the enabled analogue channels in a background thread. The channels are read in turn, each read waits for
+    a conversion at the converter data rate, and the samples are kept as (time, voltage) pairs in a ring per channel.
+    Channels enabled or disabled by a settings reload are picked up on the next round. A failed round is logged and
+    the sampler carries on a second later, so a converter error never stops sampling.
+    """
+    def __init__(self, channels, buffer_samples):
+        self._channels = channels
+        self._inputs = {}
+        self._samples = {channel_id: deque(maxlen=max(int(buffer_samples), 1)) for channel_id in channels}
+        self._stop = Event()
+        self._device = None
+        self._thread = None
+
+    def start(self, device):
+        """Starts sampling the channels of the converter."""
+        self._device = device
+        self._thread = Thread(target=self._sampler, daemon=True)
+        self._thread.name = 'Analogue sampler'
+        self._thread.start()
+
+    def _sampler(self):
+        while not self._stop.is_set():
+            round_time = 1 / self._device.data_rate
+            channel_ids = [channel_id for channel_id, channel in self._channels.items() if channel['enabled']]
+            try:
+                for channel_id in channel_ids:
+                    pin = self._channels[channel_id]['pin']
+                    if pin not in self._inputs:
+                        #pylint: disable=used-before-assignment
+                        self._inputs[pin] = AnalogIn(self._device, pin)
+                    voltage = self._inputs[pin].voltage
+                    self._samples[channel_id].append((time(), voltage))
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('Analogue conversion failed')
+                round_time = 1
+            self._stop.wait(round_time if channel_ids else 1)
+
+    def latest(self, channel_id):
+        """Returns the latest (time, voltage) sample of a channel, or None if it has not been sampled yet."""
+        samples = self._samples[channel_id]
+        return samples[-1] if samples else None
+
+    def samples(self, channel_id, since=0):
+        """Returns the buffered [time, voltage] samples of a channel taken after the given time, oldest first."""
+        return [[sample_time, voltage] for sample_time, voltage in list(self._samples[channel_id])
+                if sample_time > since]
+
+
 def check_analogue_key(item):
     """
     Check if the given item matches a digital key based on a predefined prefix.
@@ -76,11 +144,9 @@ def analogue_single_channel(item, command):
         return {'status': 'error'}
     intchannel = int(item[len(settings['analogue_prefix']):])
     if analogue_channels[intchannel]['enabled']:
-        #pylint: disable=used-before-assignment
-        chan = AnalogIn(ADC_DEVICE, analogue_channels[intchannel]['pin'])
-        voltage = chan.voltage
+        voltage, read_time = latest_value(intchannel)
         return {'item': item, 'command': command, 'values': {'%s%d' % (settings['analogue_prefix'], intchannel):
-                                                                 {'value': voltage,
+                                                                 {'value': voltage, 'read_time': read_time,
                                                                   '%s' % settings['analogue_prefix']: intchannel }}}
     logger.warning('Analogue channel %d not enabled',intchannel)
     return {'item': item, 'command': command, 'values': {'%s%d' % (settings['analogue_prefix'], intchannel):
@@ -103,11 +169,77 @@ def analogue_all_values(item, command, log_error=True):
     values = {}
     for i in range(1, 5):
         if analogue_channels[i]['enabled']:
-            chan = AnalogIn(ADC_DEVICE, analogue_channels[i]['pin'])
-            voltage = chan.voltage
+            voltage, read_time = latest_value(i)
             values['%s%d' % (settings['analogue_prefix'], i)] = {'value': voltage, '%s' % settings['analogue_prefix']: i,
                                                              'enabled': analogue_channels[i]['enabled'],
-                                                             'name': analogue_channels[i]['name']}
+                                                             'name': analogue_channels[i]['name'],
+                                                             'read_time': read_time}
     return {'item': item, 'command': command, 'values': values}
 
+
+def latest_value(channel):
+    """
+    Returns the latest voltage of a channel and the time it was read, empty strings if the channel has not been
+    sampled yet.
+    """
+    sample = sampler.latest(channel)
+    if sample is None:
+        return '', ''
+    return sample[1], sample[0]
+
+
+def analogue_voltage(channel):
+    """
+    Returns the latest voltage of an analogue channel, used to record the analogue channels in the history.
+    """
+    sample = sampler.latest(channel)
+    return sample[1] if sample else None
+
+
+def analogue_samples(item, command):
+    """
+    API handler returning the buffered samples of an analogue channel as [time, voltage] pairs. The command is a
+    dictionary with 'channel' (1 to 4) and optionally 'since', only samples taken after that time are returned.
+    """
+    if not isinstance(command, dict):
+        command = {'channel': command}
+    channel = int(command.get('channel') or 1)
+    if channel not in analogue_channels:
+        return {'item': item, 'command': command, 'values': [], 'exception': 'Unknown channel'}
+    return {'item': item, 'command': command, 'values': sampler.samples(channel, float(command.get('since') or 0))}
+
+
+def register_history_sources():
+    """Records the enabled analogue channels in the history, under their current names."""
+    for name in list(history_sources):
+        history.unregister_source(name)
+    history_sources.clear()
+    if settings['analogue_installed']:
+        for channel_id in range(1, 5):
+            if analogue_channels[channel_id]['enabled']:
+                name = '%s%d' % (settings['analogue_prefix'], channel_id)
+                history.register_source(name, lambda channel=channel_id: analogue_voltage(channel))
+                history_sources.append(name)
+
+
+def reload_analogue():
+    """
+    Reloads the analogue channel table from the settings, registered as a settings reload hook. Returns True if the
+    converter has been installed or removed, which needs a restart.
+    """
+    for channel_id in range(1, 5):
+        analogue_channels[channel_id] = settings['analogue_channels'][str(channel_id)]
+    if settings['analogue_installed'] != (ADC_DEVICE is not None):
+        logger.warning('Analogue to digital convertor installation changed, a restart is needed')
+        return True
+    register_history_sources()
+    return False
+
+
+history_sources = []
+sampler = AnalogueSampler(analogue_channels, settings['analogue_buffer_samples'])
 init_analogue()
+if ADC_DEVICE is not None:
+    sampler.start(ADC_DEVICE)
+register_history_sources()
+register_reload(reload_analogue, ('analogue_channels', 'analogue_installed', 'analogue_prefix'))
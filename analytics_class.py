@@ -0,0 +1,124 @@
+"""
+Run analytics over the recorded pyrometer and laser history.
+
+This module calculates the statistics of a heating run (heating rate, time above a threshold temperature,
+peak hold time, temperature integral and laser on time and energy) from the time-series history. The records
+of a series are read from the history store in one block and reduced with NumPy array operations, so hours of
+10 Hz data are analysed in milliseconds.
+
+A run is either an explicit time window or a laser session, the period between the laser being switched on and
+off as recorded in the laser_state series.
+"""
+from time import time
+import numpy as np
+from timeseries_class import history
+from app_control import settings
+
+RECORD_TYPE = np.dtype([('time', '<f8'), ('value', '<f8')])
+DEFAULT_HOLD_BAND = 5  # degrees below the peak that still count as holding the peak
+DEFAULT_WINDOW = 3600  # seconds analysed when no window or session is given
+
+
+def series_arrays(name, start, end):
+    """
+    Returns the times and values of a history series from start up to end as NumPy arrays.
+    """
+    records = np.frombuffer(history.records(name, start, end), dtype=RECORD_TYPE)
+    return records['time'], records['value']
+
+
+def laser_sessions(start, end):
+    """
+    Returns the (on time, off time) pairs of the laser sessions that overlap the window, found from the changes of
+    the recorded laser state. A session that is still running ends at the end of the window.
+    """
+    times, states = series_arrays('laser_state', start, end)
+    if times.size == 0:
+        return []
+    firing = states > 0
+    edges = np.flatnonzero(np.diff(firing.astype(np.int8))) + 1
+    on_times = times[edges[firing[edges]]]
+    off_times = times[edges[~firing[edges]]]
+    if firing[0]:
+        on_times = np.insert(on_times, 0, times[0])
+    if firing[-1]:
+        off_times = np.append(off_times, end)
+    return list(zip(on_times.tolist(), off_times.tolist()))
+
+
+def temperature_stats(times, values, threshold, hold_band):
+    """
+    Reduces a temperature trace to the run statistics. Durations are calculated from the time to the next sample,
+    so irregular sample rates (e.g. bursts) are weighted correctly.
+    """
+    if times.size < 2:
+        return {'samples': int(times.size)}
+    intervals = np.diff(times)
+    valid = intervals > 0
+    rates = np.diff(values)[valid] / intervals[valid]
+    peak_index = int(np.argmax(values))
+    heating_time = times[peak_index] - times[0]
+    above = values[:-1] > threshold
+    return {'samples': int(times.size),
+            'duration': float(times[-1] - times[0]),
+            'start_temp': float(values[0]),
+            'end_temp': float(values[-1]),
+            'mean_temp': float(np.sum((values[1:] + values[:-1]) * intervals) / 2 / (times[-1] - times[0]))
+                         if times[-1] > times[0] else float(values[0]),
+            'peak_temp': float(values[peak_index]),
+            'peak_time': float(times[peak_index]),
+            'heating_rate': float((values[peak_index] - values[0]) / heating_time) if heating_time > 0 else 0.0,
+            'max_heating_rate': float(rates.max()) if rates.size else 0.0,
+            'max_cooling_rate': float(max(-rates.min(), 0.0)) if rates.size else 0.0,
+            'threshold': threshold,
+            'time_above_threshold': float(np.sum(intervals[above])),
+            'hold_band': hold_band,
+            'peak_hold_time': float(np.sum(intervals[values[:-1] >= values[peak_index] - hold_band])),
+            'integral': float(np.sum((values[1:] + values[:-1]) * intervals) / 2),
+            'integral_above_threshold': float(np.sum(np.clip(values[:-1] - threshold, 0, None) * intervals))}
+
+
+def laser_stats(start, end):
+    """
+    Returns the laser on time and the energy delivered as the integral of the power setting (%) while firing.
+    """
+    state_times, states = series_arrays('laser_state', start, end)
+    power_times, powers = series_arrays('laser_power', start, end)
+    if state_times.size < 2:
+        return {'laser_on_time': 0.0, 'laser_energy': 0.0, 'laser_mean_power': 0.0}
+    intervals = np.diff(state_times)
+    firing = states[:-1] > 0
+    if power_times.size:
+        power_at = powers[np.clip(np.searchsorted(power_times, state_times[:-1], side='right') - 1, 0, None)]
+    else:
+        power_at = np.zeros(firing.size)
+    on_time = float(np.sum(intervals[firing]))
+    energy = float(np.sum(power_at[firing] * intervals[firing]))
+    return {'laser_on_time': on_time, 'laser_energy': energy,
+            'laser_mean_power': energy / on_time if on_time > 0 else 0.0}
+
+
+def run_stats(item, command):
+    """
+    API handler for run statistics. The command is a dictionary with either 'start' and 'end' (unix timestamps) or
+    'session' (1 for the latest laser session, 2 for the one before and so on, searched within the last
+    'search' seconds, default 24 hours). Optional keys are 'threshold' (default pyro-min-temp) and 'hold_band'
+    (degrees below the peak counted as peak hold, default 5).
+    """
+    if not isinstance(command, dict):
+        command = {'session': 1}
+    end = float(command.get('end') or time())
+    start = float(command.get('start') or end - DEFAULT_WINDOW)
+    if command.get('session'):
+        sessions = laser_sessions(end - float(command.get('search', 86400)), end)
+        session = int(command['session'])
+        if session < 1 or session > len(sessions):
+            return {'item': item, 'command': command, 'values': {}, 'exception': 'Laser session not found'}
+        start, end = sessions[-session]
+    threshold = float(command.get('threshold', settings['pyro-min-temp']))
+    hold_band = float(command.get('hold_band', DEFAULT_HOLD_BAND))
+    times, values = series_arrays('temperature', start, end)
+    values_out = {'start': start, 'end': end}
+    values_out.update(temperature_stats(times, values, threshold, hold_band))
+    values_out.update(laser_stats(start, end))
+    return {'item': item, 'command': command, 'values': values_out}
@@ -8,93 +8,190 @@ The module serves as an interface between API requests and the application's
 configuration system, validating inputs and handling potential errors during
 the parsing process.
 
+Requests are dispatched through a routing table that maps every item name (including the channel items of the
+digital, analogue and serial channels and the digital -pwm and -frequency items) to its handler and to whether it only
+reads hardware state, so a request is routed with one dict lookup. The table is built at startup and rebuilt by a
+settings reload hook when the settings change.
+
+Status reads are coalesced: concurrent identical read requests share one in-flight
+hardware read, and with settings['api_read_freshness'] > 0 a read completed within
+that many seconds is returned again, so hardware load stays flat as clients are added.
+
 Functions:
     parsecontrol: Process API control commands and return appropriate responses
+    build_routes: Builds the item routing table
+    find_route: Looks up the handler of an item
+    route_control: Dispatches a request to the module that handles it
 
 Dependencies:
     app_control: For accessing and writing application settings
     logmanager: For logging activities and errors
 """
 
-from app_control import settings
-from config_class import (set_appname, get_netifo, set_netinfo, updatesetting, restart_services,
+from app_control import settings, register_reload
+from config_class import (set_appname, get_netifo, set_netinfo, updatesetting, apply_settings,
                           set_analogue_settings, set_digital_settings)
-from digital_class import digital_all_values, check_digital_key, digital_single_channel
-from analogue_class import analogue_all_values, check_analogue_key, analogue_single_channel
+from digital_class import digital_all_values, digital_single_channel, digital_snapshot
+from analogue_class import analogue_all_values, analogue_single_channel, analogue_samples
 from serial_class import (update_serial_channel, update_serial_message, delete_serial_message,
-                          serial_http_data, serial_api_checker, serial_api_parser)
+                          serial_http_data, serial_api_checker, serial_api_parser, serial_channels)
+from singleflight_class import SingleFlight
+from timeseries_class import history
 from logmanager import logger
 from custom_api import custom_api, custom_parser
 
-# pylint: disable=too-many-return-statements
+READ_ITEMS = ('serialstatus', 'digitalstatus', 'analoguestatus', 'laser_status', 'get_temperature')
+hardware_reads = SingleFlight()
+
+
 def parsecontrol(item, command):
+    """
+    Processes an API request. Requests that only read hardware state are passed through the single-flight layer so
+    that identical concurrent reads share one hardware access, everything else is dispatched directly.
+    """
+    route = find_route(item)
+    if route is None:
+        logger.warning('unknown item %s command %s', item, command)
+        return {'error': 'unknown api command'}
+    handler, read = route
+    if read is None:
+        read = COMMAND_READS[handler](command)
+    if read:
+        return hardware_reads.run((item, str(command)), settings['api_read_freshness'], route_control, item, command,
+                                  handler)
+    return route_control(item, command, handler)
+
+
+def find_route(item):
+    """
+    Returns the (handler, read) route of an item, or None for unknown items. read is True for items that only read
+    hardware state, False for items that change state, or None for items that do either, whose handler then has a
+    function in COMMAND_READS that tells from the command. Items that only start with a serial channel name fall back
+    to the serial prefix search.
+    """
+    route = routes.get(item)
+    if route is None and serial_api_checker(item):
+        return serial_api_parser, False
+    return route
+
+
+def digital_read_command(command):
+    """Returns True if a digital channel command reads the channel rather than switching it."""
+    return command not in (settings['digital_on_command'], settings['digital_off_command'])
+
+
+COMMAND_READS = {digital_single_channel: digital_read_command}
+
+
+def build_routes():
+    """
+    Builds the item routing table from the current settings and channels. Entries added later take precedence, so the
+    custom api items override the built in items of the same name.
+    """
+    digital_prefix = settings['digital_prefix']
+    analogue_prefix = settings['analogue_prefix']
+    table = {'api_read_stats': (lambda item, command: {'item': item, 'command': command,
+                                                       'values': hardware_reads.stats()}, False),
+             'serialstatus': (lambda item, command: serial_http_data(False, False), True),
+             'digitalstatus': (lambda item, command: digital_all_values(False, False), True),
+             'analoguestatus': (lambda item, command: analogue_all_values(False, False, command), True),
+             'getnetinfo': (lambda item, command: get_netifo(), False),
+             'history': (history.query, False),
+             'update_serial_channel': (lambda item, command: applied(update_serial_channel(command)), False),
+             'update_serial_message': (lambda item, command: applied(update_serial_message(command)), False),
+             'delete_serial_message': (lambda item, command: applied(delete_serial_message(command)), False),
+             'setnetinfo': (set_network, False),
+             'setappname': (lambda item, command: set_appname(command), False),
+             'set_oled': (set_oled, False),
+             'updatesetting': (update_settings, False),
+             'getsettings': (lambda item, command: settings, False),
+             'analogue_settings': (lambda item, command: set_analogue_settings(command), False),
+             'digital_settings': (lambda item, command: set_digital_settings(command), False)}
+    for channel in serial_channels.values():
+        table[channel.name()] = (serial_api_parser, False)
+        table[channel.name() + 'status'] = (serial_api_parser, True)
+    for channel_id in range(1, 5):
+        table['%s%d' % (analogue_prefix, channel_id)] = (analogue_single_channel, True)
+    table['%sstatus' % analogue_prefix] = (analogue_all_values, True)
+    table['%ssamples' % analogue_prefix] = (analogue_samples, False)
+    for channel_id in range(1, 17):
+        table['%s%d' % (digital_prefix, channel_id)] = (digital_single_channel, None)
+        table['%s%d-pwm' % (digital_prefix, channel_id)] = (digital_single_channel, False)
+        table['%s%d-frequency' % (digital_prefix, channel_id)] = (digital_single_channel, False)
+    table['%sstatus' % digital_prefix] = (digital_all_values, True)
+    table['%ssnapshot' % digital_prefix] = (digital_snapshot, False)
+    for custom_item in custom_api:
+        table[custom_item] = (custom_parser, custom_item in READ_ITEMS)
+    return table
+
+
+def set_network(_item, command):
+    """Sets the network configuration from an API request."""
+    mode = command['ipv4.method']
+    ip_addr = command['IP4.ADDRESS']
+    nwclass = command['IP4.SUBNET']
+    df_gw = command['IP4.GATEWAY']
+    dns_server = command['IP4.DNS']
+    return set_netinfo(mode, ip_addr, nwclass, df_gw, dns_server)
+
+
+def set_oled(_item, command):
+    """Enables or disables the OLED display and applies the change."""
+    if 'oled-enabled' in command.keys():
+        updatesetting({'oled_enabled': True})
+    else:
+        updatesetting({'oled_enabled': False})
+    apply_settings(('oled_enabled',))
+    return {'success': 'settings applied'}
+
+
+def update_settings(_item, command):
+    """Updates settings and applies them, restarting if a changed setting is only read at start up."""
+    changed = [key for key in command if settings.get(key) != command[key]] if isinstance(command, dict) else []
+    updatesetting(command)
+    apply_settings(changed)
+    return settings
+
+
+def applied(result):
+    """Applies the serial channel settings changed by a handler and returns the handler result."""
+    apply_settings(('serial_channels',))
+    return result
+
+
+def rebuild_routes():
+    """
+    Rebuilds the routing table after a settings change, as the item prefixes or channels may have changed. Registered
+    as the last settings reload hook, after the channels have been reloaded.
+    """
+    global routes  # pylint: disable=global-statement
+    routes = build_routes()
+    return False
+
+
+def route_control(item, command, handler=None):
     """
     Processes the given command for a specific item and returns the result of the operation.
 
-    The function identifies the type of item and executes the corresponding command or operation.
-    Based on the provided item and command data, it processes actions such as setting
-    channel states, retrieving or setting network information, updating settings, managing OLED status,
-    and much more. If an unknown item or command is provided, it logs the issue and responds
-    with an error message.
+    The handler is looked up in the routing table if it is not given. If an unknown item or a bad command is
+    provided, it logs the issue and responds with an error message.
     """
     try:
-        if item in custom_api:
-            return custom_parser(item, command)
-        if item == 'serialstatus':
-            return serial_http_data(False, False)
-        if item == 'digitalstatus':
-            return digital_all_values(False, False)
-        if item == 'analoguestatus':
-            return analogue_all_values(False, False, command)
-        if check_digital_key(item):  # read status of a digital channel
-            return digital_single_channel(item, command)
-        if item == '%sstatus' % settings['digital_prefix']:
-            return digital_all_values(item, command)
-        if check_analogue_key(item):  # read status of an analogue channel
-            return analogue_single_channel(item, command)
-        if item == '%sstatus' % settings['analogue_prefix']:
-            return analogue_all_values(item, command)
-        if serial_api_checker(item):
-            return serial_api_parser(item, command)
-        if item == 'getnetinfo':
-            return get_netifo()
-        if item == 'update_serial_channel':
-            return update_serial_channel(command)
-        if item == 'update_serial_message':
-            return update_serial_message(command)
-        if item == 'delete_serial_message':
-            return delete_serial_message(command)
-        if item == 'setnetinfo':
-            mode = command['ipv4.method']
-            ip_addr = command['IP4.ADDRESS']
-            nwclass = command['IP4.SUBNET']
-            df_gw = command['IP4.GATEWAY']
-            dns_server = command['IP4.DNS']
-            return set_netinfo(mode, ip_addr, nwclass, df_gw, dns_server)
-        if item == 'setappname':
-            return set_appname(command)
-        if item == 'set_oled':
-            if 'oled-enabled' in command.keys():
-                updatesetting({'oled_enabled': True})
-            else:
-                updatesetting({'oled_enabled': False})
-            restart_services()
-            return {'success': 'services restarted'}
-        if item == 'updatesetting':
-            updatesetting(command)
-            restart_services()
-            return settings
-        if item == 'getsettings':
-            return settings
-        if item == 'analogue_settings':
-            return set_analogue_settings(command)
-        if item == 'digital_settings':
-            return set_digital_settings(command)
-        logger.warning('unknown item %s command %s', item, command)
-        return {'error': 'unknown api command'}
+        if handler is None:
+            route = find_route(item)
+            if route is None:
+                logger.warning('unknown item %s command %s', item, command)
+                return {'error': 'unknown api command'}
+            handler = route[0]
+        return handler(item, command)
     except ValueError:
         logger.error('API Parser incorrect json message, value error')
         return {'error': 'bad value in json message'}
     except IndexError:
         logger.error('API Parser incorrect json message, index error')
         return {'error': 'Bad index in json message'}
+
+
+routes = build_routes()
+register_reload(rebuild_routes, ('digital_prefix', 'analogue_prefix', 'digital_on_command', 'digital_off_command',
+                                 'api_read_freshness'))
@@ -32,7 +32,8 @@ from app_control import VERSION, API_KEY, settings
 from logmanager import logger
 from oled_class import set_oled
 from api_parser import parsecontrol
-from serial_class import serial_ports, serial_port_info
+from serial_class import serial_port_info
+from serial_discovery_class import serial_port_details
 from camera_class import video_camera_instance_0, video_camera_instance_1
 
 app = Flask(__name__)
@@ -172,7 +173,7 @@ def config():
     set_oled()
     return render_template('config.html', apikey=API_KEY, version=VERSION, settings=settings,
                            netinfo=parsecontrol('getnetinfo', True), year=YEAR,
-                           serial_ports=serial_ports())
+                           serial_ports=serial_port_details())
 
 
 @app.route('/serial', methods=['GET', 'POST'])
@@ -14,6 +14,19 @@ Attributes:
         - logfilepath (str): Path to application log file
         - gunicornpath (str): Base directory for Gunicorn log files
 
+Settings are persisted by a SettingsWriter: writesettings() only marks the settings as changed, a background thread
+writes them settings['settings_write_delay'] seconds later, so a burst of changes (e.g. a laser power sweep) is one
+write and the request thread never waits for the SD card. The file is written to a temporary file, synced and
+renamed over settings.json, so a crash or power cut leaves either the old or the new file, never a partial one.
+flush_settings() writes any pending change immediately and is called at exit and before the services are restarted.
+
+Modules that hold state derived from the settings (logging, digital, analogue and serial channels, the API routing
+table) register a reload hook with register_reload(), naming the settings the hook applies. After a settings change
+reload_settings() calls every hook so the change applies in-process, only a change that needs the hardware to be set
+up again (e.g. a channel direction or serial port) makes a hook ask for a restart. A changed setting that no hook
+names (e.g. the PID gains or the serial engine) is only read at start up, so cold_settings() reports it and the
+application is restarted.
+
 Note:
     This module is a central configuration point for the application and should
     be imported by other modules that need access to global settings or version
@@ -21,13 +34,17 @@ Note:
 
 """
 
+import atexit
+import os
 import random
 import json
+from threading import Thread, Event, Lock
+from time import sleep
 from base64 import b64decode, b64encode
 from datetime import datetime
 from custom_settings import custom_settings
 
-VERSION = '1.6.0'
+VERSION = '1.6.25'
 API_KEY=''
 
 def initialise():
@@ -49,6 +66,9 @@ def initialise():
                  'digital_on_command': '1',
                  'digital_off_value': '0',
                  'digital_off_command': '0',
+                 'digital_snapshot_max_age': 0.2,
+                 'pwm_sysfs_root': '/sys/class/pwm',
+                 'pwm_sysfs_chip': 'pwmchip0',
                  'digital_channels': {
                  '1': {'name': 'Digital 1', 'gpio': 26, 'direction': 'output', 'enabled': True, 'excluded': '0',
                         'pwm': 50, 'frequency': 500},
@@ -85,13 +105,22 @@ def initialise():
                  'analogue_prefix': 'analogue',
                  'analogue_installed': False,
                  'analogue_i2c': 0x48,
+                 'analogue_data_rate': 128,
+                 'analogue_buffer_samples': 1000,
                  'analogue_channels': {
                  '1': {'name': 'Analogue 1', 'pin': 0, 'enabled': False},
                  '2': {'name': 'Analogue 2', 'pin': 1, 'enabled': False},
                  '3': {'name': 'Analogue 3', 'pin': 2, 'enabled': False},
                  '4': {'name': 'Analogue 4', 'pin': 3, 'enabled': False}},
                  'serial_channels': [],
-                 'serial_debug': False
+                 'serial_debug': False,
+                 'serial_engine': 'threaded',
+                 'api_read_freshness': 0,
+                 'history_path': 'history',
+                 'history_ram_samples': 3600,
+                 'history_interval': 1,
+                 'history_retention_days': 30,
+                 'settings_write_delay': 1
                  }
     isettings.update(custom_settings)
     return isettings
@@ -103,11 +132,94 @@ def generate_api_key(key_len):
     return ''.join(random.choice(allowed_characters) for _ in range(key_len))
 
 
+class SettingsWriter:
+    """
+    Writes the settings to the json file in the background. Changes are marked with mark_changed() and written
+    together once the write delay has passed since the first unsaved change.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._changed = Event()
+        self._write_lock = Lock()
+        self._thread_lock = Lock()  # separate from the write lock so mark_changed never waits for a write
+        self._thread = None
+        atexit.register(self.flush)
+
+    def mark_changed(self):
+        """Marks the settings as changed, they are written after the write delay."""
+        self._changed.set()
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._writer, daemon=True)
+                self._thread.name = 'Settings writer'
+                self._thread.start()
+
+    def _writer(self):
+        while True:
+            self._changed.wait()
+            sleep(settings['settings_write_delay'])
+            self.flush()
+
+    def flush(self):
+        """Writes the settings now if they have changed since the last write."""
+        with self._write_lock:
+            if not self._changed.is_set():
+                return
+            self._changed.clear()
+            settings['LastSave'] = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+            try:
+                data = json.dumps(settings, indent=4, sort_keys=True)
+            except RuntimeError:  # the settings changed while they were serialised, write them next time
+                self._changed.set()
+                return
+            temp_path = self._path + '.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as outfile:
+                    outfile.write(data)
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                os.replace(temp_path, self._path)
+                directory = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY)
+                try:
+                    os.fsync(directory)
+                finally:
+                    os.close(directory)
+            except OSError as error:
+                print('Settings could not be written: %s' % error)
+                self._changed.set()
+
+
+def register_reload(hook, keys=()):
+    """
+    Registers a function that applies changed settings in-process, keys are the top level settings it applies. The
+    hook returns True if a change it found can only be applied by restarting the application. Hooks are called in the
+    order they were registered.
+    """
+    reload_hooks.append(hook)
+    hot_settings.update(keys)
+
+
+def cold_settings(changed):
+    """Returns the changed settings that no reload hook applies, a change to any of them needs a restart"""
+    return sorted(key for key in changed if key not in hot_settings)
+
+
+def reload_settings():
+    """Calls every reload hook, returns True if any of them needs the application to be restarted"""
+    restart = False
+    for hook in reload_hooks:
+        restart = bool(hook()) or restart
+    return restart
+
+
 def writesettings():
-    """Write settings to a json file"""
-    settings['LastSave'] = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-    with open('settings.json', 'w', encoding='utf-8') as outfile:
-        json.dump(settings, outfile, indent=4, sort_keys=True)
+    """Marks the settings as changed, they are written to the json file by the settings writer"""
+    settings_writer.mark_changed()
+
+
+def flush_settings():
+    """Writes any unsaved settings changes to the json file now"""
+    settings_writer.flush()
 
 def readsettings():
     """Read the json file"""
@@ -192,5 +304,8 @@ def jscriptname(sourcename: str) -> str:
         sourcename = sourcename.replace(invalid_char, '')
     return sourcename.lower()
 
+settings_writer = SettingsWriter('settings.json')
+reload_hooks = []
+hot_settings = set()
 settings = initialise()
 loadsettings()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+API dispatch micro-benchmark
+
+Compares the routing table lookup of api_parser with the item checks of the if chain used before the table was
+introduced. Handlers are not called, only the cost of finding them is measured. Run it from the application
+directory (it loads settings.json and the hardware modules like the application does):
+
+    python bin/route_benchmark.py
+"""
+import os
+import sys
+from functools import partial
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from app_control import settings
+from api_parser import find_route
+from custom_api import custom_api
+from digital_class import check_digital_key
+from analogue_class import check_analogue_key
+from serial_class import serial_channels
+
+CALLS = 100000
+
+
+def serial_api_checker(item):
+    """The serial channel check of the former if chain, a prefix search of every channel name."""
+    for channel in serial_channels.values():
+        if item[:len(channel.name())] == channel.name():
+            return True
+    return False
+
+
+def chain_lookup(item):
+    """The item checks of the former if chain, in their original order."""
+    if item in custom_api or item in ('serialstatus', 'digitalstatus', 'analoguestatus'):
+        return True
+    if check_digital_key(item) or item == '%sstatus' % settings['digital_prefix']:
+        return True
+    if item == '%ssnapshot' % settings['digital_prefix']:
+        return True
+    if check_analogue_key(item) or item == '%sstatus' % settings['analogue_prefix']:
+        return True
+    if serial_api_checker(item):
+        return True
+    return item in ('getnetinfo', 'history', 'update_serial_channel', 'update_serial_message',
+                    'delete_serial_message', 'setnetinfo', 'setappname', 'set_oled', 'updatesetting',
+                    'getsettings', 'analogue_settings', 'digital_settings')
+
+
+def main():
+    """Prints the time per lookup of each method for a set of items."""
+    for item in ('laser_status', '%s9-pwm' % settings['digital_prefix'], '%s3' % settings['analogue_prefix'],
+                 'getsettings', 'digital_settings', 'unknown'):
+        before = timeit(partial(chain_lookup, item), number=CALLS) / CALLS * 1e6
+        after = timeit(partial(find_route, item), number=CALLS) / CALLS * 1e6
+        print('%-20s if chain %6.2f us   routing table %6.2f us' % (item, before, after))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ Key Features:
     - IP address validation: Verify IP addresses and network class formats
     - Application naming: Manage application names with automatic sanitization
     - System hostname: Update system hostname based on application name
+    - Settings changes: Applied in-process through the settings reload hooks, restarting only when needed
 
 Functions:
     friendlydirname(sourcename): Sanitizes strings by removing invalid characters
@@ -28,7 +29,7 @@ Dependencies:
 
 import subprocess
 import re
-from app_control import settings, writesettings, friendlyname
+from app_control import settings, writesettings, flush_settings, friendlyname, reload_settings, cold_settings
 from logmanager import logger
 
 
@@ -207,20 +208,36 @@ def restart_services():
     Restart system services using the systemctl command.
 
     This function logs the action of restarting services, executes the system command to
-    restart the `gunicorn` service, and logs the completion of the operation.
+    restart the `gunicorn` service, and logs the completion of the operation. Unsaved settings are written first.
     """
+    flush_settings()
     logger.info('restarting services')
     subprocess.Popen( '/bin/sudo /bin/systemctl restart gunicorn.service', shell=True,
                      stdout=subprocess.PIPE).stdout.read().decode(encoding='utf-8')
     logger.info('services restarted')
 
 
+def apply_settings(changed):
+    """
+    Applies changed settings in-process through the settings reload hooks. The services are restarted if a hook
+    found a change that needs it, such as a new pin setup or serial port, or if a changed setting (one of the keys in
+    changed) is not applied by any hook.
+    """
+    cold = cold_settings(changed)
+    if cold:
+        logger.info('settings %s need a restart', ', '.join(cold))
+    if cold or reload_settings():
+        restart_services()
+    else:
+        logger.info('settings applied without restart')
+
+
 def set_analogue_settings(newsettings):
     """
     Updates the analogue settings by modifying specific configuration parameters. The function
     ensures that the analogue prefix is distinct from the digital prefix, updates channel names,
     enable/disable states based on the provided input, writes the changes to persistent storage,
-    logs the update information, and restarts relevant services to apply changes.
+    logs the update information, and applies the changes in-process (restarting only if needed).
 
     :param newsettings: A dictionary containing the new settings for the analogue configuration.
         It should include keys for channel names (e.g., 'ch1-name', 'ch2-name', etc.) and their
@@ -253,13 +270,14 @@ def set_analogue_settings(newsettings):
         settings['analogue_channels']['4']['enabled'] = False
     writesettings()
     logger.info('analogue settings updated')
-    restart_services()
+    apply_settings(('analogue_prefix', 'analogue_channels'))
 
 def set_digital_settings(newsettings):
     """
     Updates the digital settings configuration, including prefix, value, and command settings, as well as
     individual channel configurations such as name, direction, exclusion, and enablement. After applying
-    the new settings, related services are restarted, and an informational log entry is created.
+    the new settings, they are applied in-process (restarting only if needed), and an informational log entry is
+    created.
 
     :param newsettings: A dictionary containing the updated digital settings and individual channel
         configurations. Expected keys are:
@@ -275,7 +293,6 @@ def set_digital_settings(newsettings):
 
     :return: None
     """
-    print(newsettings)
     if newsettings['digital_prefix'] != settings['analogue_prefix']:
         settings['digital_prefix'] = newsettings['digital_prefix']
     settings['digital_on_value'] = newsettings['digital_on_value']
@@ -292,6 +309,8 @@ def set_digital_settings(newsettings):
             settings['digital_channels']['%d' % i]['enabled'] = False
         settings['digital_channels']['%d' % i]['pwm'] = newsettings['ch%d-pwm' %i]
         settings['digital_channels']['%d' % i]['frequency'] = newsettings['ch%d-frequency' %i]
+        settings['digital_channels']['%d' % i]['pwm_backend'] = newsettings.get('ch%d-pwm_backend' % i, 'software')
     writesettings()
     logger.info('digital settings updated')
-    restart_services()
+    apply_settings(('digital_prefix', 'digital_on_value', 'digital_off_value', 'digital_on_command',
+                    'digital_off_command', 'digital_channels'))
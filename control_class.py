@@ -0,0 +1,167 @@
+"""
+Closed-loop temperature control of the laser power.
+
+This module holds a sample at a target temperature by driving the laser PWM duty cycle from the pyrometer
+readings with a PID controller. The controller runs in-process at a fixed control rate (settings['pid-rate'] in Hz)
+and reads the latest pyrometer sample directly, so the loop latency is the pyrometer sample period instead of the
+round trip of a client polling get_temperature and calling set_laser_power.
+
+The laser is switched on and off through LaserObject.laser_on_off, so the key and door interlocks and the
+laser-maxtime timeout still apply. Control stops as soon as the laser is switched off for any reason.
+
+The control updates run as a periodic job on the shared scheduler, which is cancelled when control stops.
+
+Classes:
+    PidController: PID controller with output limits and anti-windup
+    TemperatureController: Control loop between the pyrometer and the laser power
+"""
+from threading import Lock
+from logmanager import logger
+from app_control import settings
+from scheduler_class import scheduler
+from laser_class import laser
+from pyrometer_class import pyrometer
+
+
+class PidController:
+    """
+    A PID controller with output limits. The derivative is taken on the measurement so setpoint changes do not kick
+    the output, and the integral is only accumulated while the output is not saturated in the direction of the error
+    (conditional integration), so it cannot wind up while the output is held at a limit.
+    """
+    def __init__(self, kp, ki, kd, output_min, output_max):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_min = output_min
+        self.output_max = output_max
+        self._integral = 0.0
+        self._last_measurement = None
+
+    def reset(self, integral=0.0):
+        """Clears the controller state, the integral may be preset to give a bumpless start."""
+        self._integral = integral
+        self._last_measurement = None
+
+    def update(self, setpoint, measurement, interval):
+        """Returns the new output for a measurement taken interval seconds after the previous one."""
+        error = setpoint - measurement
+        derivative = 0.0
+        if self._last_measurement is not None and interval > 0:
+            derivative = -(measurement - self._last_measurement) / interval
+        self._last_measurement = measurement
+        integral = self._integral + self.ki * error * interval
+        output = self.kp * error + integral + self.kd * derivative
+        if output > self.output_max:
+            output = self.output_max
+            if error < 0:
+                self._integral = integral
+        elif output < self.output_min:
+            output = self.output_min
+            if error > 0:
+                self._integral = integral
+        else:
+            self._integral = integral
+        return output
+
+
+class TemperatureController:
+    """
+    Runs the control loop as a scheduler job. When a setpoint is set the laser is switched on and the laser power is
+    updated at the control rate from the latest pyrometer reading. If no new reading has arrived since the last
+    update the output is held.
+    """
+    def __init__(self):
+        self._pid = PidController(settings['pid-kp'], settings['pid-ki'], settings['pid-kd'],
+                                  settings['pid-min-power'], settings['pid-max-power'])
+        self._setpoint = None
+        self._output = 0.0
+        self._last_sample = 0
+        self._lock = Lock()
+        self._control_job = None
+
+    def control_step(self):
+        """
+        Runs one controller update with the latest pyrometer reading, called at the control rate. Control is stopped
+        if the laser has been switched off or an interlock has opened.
+        """
+        if not laser.firing() or not laser.enabled():
+            logger.warning('ControlClass laser off or interlock open, temperature control stopped')
+            self.stop()
+            return
+        temperature, read_time = pyrometer.latest_temperature()
+        with self._lock:
+            if self._setpoint is None or read_time <= self._last_sample:
+                return
+            interval = read_time - self._last_sample if self._last_sample else 0
+            self._last_sample = read_time
+            self._output = self._pid.update(self._setpoint, temperature, interval)
+        laser.set_power_output(self._output)
+
+    def start(self, setpoint):
+        """
+        Sets the target temperature and switches the laser on if it is not already firing. Returns an error message if
+        the laser could not be switched on, e.g. the key is off or the door is open.
+        """
+        with self._lock:
+            starting = self._setpoint is None
+            self._setpoint = setpoint
+            if starting:
+                self._pid.reset(settings['pid-min-power'])
+                self._output = settings['pid-min-power']
+                self._last_sample = 0
+        if starting:
+            if not laser.firing():
+                status = laser.laser_on_off('laser', 1)
+                if 'exception' in status:
+                    with self._lock:
+                        self._setpoint = None
+                    return status['exception']
+            laser.set_power_output(self._output)
+            self._control_job = scheduler.call_every(1 / settings['pid-rate'], self.control_step, delay=0)
+            logger.info('ControlClass temperature control started, setpoint %s', setpoint)
+        else:
+            logger.info('ControlClass temperature setpoint changed to %s', setpoint)
+        return ''
+
+    def stop(self):
+        """Stops temperature control and switches the laser off."""
+        with self._lock:
+            if self._setpoint is None:
+                return
+            self._setpoint = None
+            if self._control_job is not None:
+                self._control_job.cancel()
+                self._control_job = None
+        laser.set_power_output(None)
+        if laser.firing():
+            laser.laser_on_off('laser', 0)
+        logger.info('ControlClass temperature control stopped')
+
+    def status(self):
+        """Returns the controller state."""
+        return {'setpoint': self._setpoint, 'controlling': self._setpoint is not None, 'power': self._output,
+                'temperature': pyrometer.latest_temperature()[0], 'rate': settings['pid-rate'],
+                'kp': self._pid.kp, 'ki': self._pid.ki, 'kd': self._pid.kd,
+                'min_power': self._pid.output_min, 'max_power': self._pid.output_max}
+
+    def set_temperature(self, item, command):
+        """
+        API handler for the temperature setpoint. A setpoint above 0 starts or adjusts temperature control, 0 stops
+        control and switches the laser off.
+        """
+        setpoint = float(command)
+        if setpoint > 0:
+            exception = self.start(setpoint)
+            if exception:
+                return {'item': item, 'command': command, 'values': self.status(), 'exception': exception}
+        else:
+            self.stop()
+        return {'item': item, 'command': command, 'values': self.status()}
+
+    def control_status(self, item, command):
+        """API handler returning the controller state."""
+        return {'item': item, 'command': command, 'values': self.status()}
+
+
+temperature_controller = TemperatureController()
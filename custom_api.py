@@ -10,9 +10,12 @@ generated.
 from logmanager import logger
 from laser_class import laser
 from pyrometer_class import pyrometer
+from analytics_class import run_stats
+from control_class import temperature_controller
 
 
-custom_api = ['digitalstatus', 'xserialstatus', 'laser_status', 'laser', 'set_laser_power', 'set_laser_timeout','get_temperature', 'reset_max','pyro_laser']
+custom_api = ['digitalstatus', 'xserialstatus', 'laser_status', 'laser', 'set_laser_power', 'set_laser_timeout','get_temperature', 'reset_max','pyro_laser',
+              'pyro_burst', 'run_stats', 'set_temperature', 'control_status']
 
 def custom_parser (item, command):
     """custom api commands, the items must be listed in the custom_api list for these to be called"""
@@ -29,10 +32,18 @@ def custom_parser (item, command):
             return laser.http_status_data(item, command)
         if item == 'get_temperature':
             return pyrometer.get_temperatures(item, command)
+        if item == 'set_temperature':
+            return temperature_controller.set_temperature(item, command)
+        if item == 'control_status':
+            return temperature_controller.control_status(item, command)
+        if item == 'run_stats':
+            return run_stats(item, command)
         if item == 'reset_max':
             return pyrometer.reset_max(item, command)
         if item == 'pyro_laser':
             return pyrometer.laser_on_off(item, command)
+        if item == 'pyro_burst':
+            return pyrometer.burst_data(item, command)
         logger.warning('unknown item %s command %s', item, command)
         return {'error': 'unknown custom api command'}
     except ValueError:
@@ -91,7 +91,8 @@ custom_settings = {
             'enabled': True,
             'excluded': '0',
             'pwm': 5,
-            'frequency': 500
+            'frequency': 500,
+            'pwm_backend': 'hardware'
         },
         '10': {
             'name': 'not configured',
@@ -164,39 +165,60 @@ custom_settings = {
         'messages': [
             {
             'api-command': '',
+            'format': 'B',
+            'gap': 50,
             'length': 0,
             'name': 'Pyrometer laser',
+            'offset': 0,
+            'reply-length': 1,
+            'scale': 1,
             'start': 0,
             'string1': 'JQ==',
-            'string2': ''
+            'string2': '',
+            'terminator': ''
             },
             {
                 'api-command': 'pyrolaser-off',
+                'gap': 50,
                 'length': 0,
                 'name': 'pyrometer laser off',
+                'reply-length': 0,
                 'start': 0,
                 'string1': 'pQCl',
-                'string2': ''
+                'string2': '',
+                'terminator': ''
             },
             {
                 'api-command': 'pyrolaser-on',
+                'gap': 50,
                 'length': 0,
                 'name': 'pyro laser off',
+                'reply-length': 0,
                 'start': 0,
                 'string1': 'pQGk',
-                'string2': ''
+                'string2': '',
+                'terminator': ''
             },
             {
                 'api-command': '',
+                'format': '>H',
+                'gap': 50,
                 'length': 0,
                 'name': 'temperature',
+                'offset': -100,
+                'reply-length': 2,
+                'scale': 0.1,
                 'start': 0,
                 'string1': 'AQ==',
-                'string2': ''
+                'string2': '',
+                'terminator': ''
             }
         ],
+        'change_threshold': 0.5,
+        'fast_poll_interval': 0.5,
         'mode': 'interactive',
         'poll_interval': 5,
+        'polling': 'adaptive',
         'port': '/dev/ttyUSB0'
         }
     ],
@@ -228,7 +250,19 @@ custom_settings = {
         'cameraWidth': 480
         },
     'pyro-running-average': 5,
+    'pyro-filter': 'average',
+    'pyro-ewma-alpha': 0.3,
+    'pyro-ui-interval': 0.5,
+    'pyro-burst-samples': 50000,
     'pyro-min-temp': 385,
     'laser-maxtime': 300,
+    'interlock-debounce-ms': 20,
+    'interlock-recheck': 5,
+    'pid-kp': 0.5,
+    'pid-ki': 0.05,
+    'pid-kd': 0.0,
+    'pid-rate': 10,
+    'pid-min-power': 0,
+    'pid-max-power': 100,
     'app-name': 'Laser Controller'
 }
@@ -10,24 +10,84 @@ Key features:
 - Support for reading digital input values from GPIO pins
 - Support for writing digital output values to GPIO pins
 - Helper functions for checking digital key format and converting values
+- Channel names, enables, exclusions and PWM settings are reloaded in-process when the settings change, only a
+  change of pin, direction or PWM backend needs a restart
+- DigitalBank snapshot reads of all channels, cached briefly and shared by every status consumer. The input
+  channels are claimed as one lgpio group and read with a single group read per snapshot
+- Software PWM through RPi.GPIO or hardware PWM through the kernel sysfs interface, selected per channel
 - System-wide digital channel initialization and management
 
 The module integrates with the application's settings and logging systems to provide
 consistent behavior and traceable operations across the entire application.
 
+PWM outputs have a pwm_backend channel setting. 'software' uses RPi.GPIO software PWM, which works on any pin but
+is timed by a thread and jitters under load. 'hardware' drives the PWM peripheral through
+settings['pwm_sysfs_root']/settings['pwm_sysfs_chip'] (the pwm-2chan overlay must be loaded), which is jitter free
+and uses no CPU. Only GPIO 12, 13, 18 and 19 can be driven by the PWM peripheral, other pins and systems without the
+sysfs interface fall back to software PWM.
+
 Dependencies:
-    RPi.GPIO: For hardware-level GPIO control
+    RPi.GPIO: For hardware-level GPIO control (provided by rpi-lgpio)
+    lgpio: For the group read of the input channels
     logmanager: For logging GPIO operations and errors
     app_control: For accessing application-wide settings
+    pwm_class: For hardware PWM through the kernel sysfs interface
 """
 
+from collections import namedtuple
+from threading import Lock
+from time import time, monotonic
+import lgpio
 from RPi import GPIO
 from logmanager import logger
-from app_control import settings, writesettings
+from app_control import settings, writesettings, register_reload
+from pwm_class import SysfsPwm, HARDWARE_PWM_CHANNELS
 
 GPIO.setwarnings(False)
 GPIO.setmode(GPIO.BCM)
 
+DigitalSnapshot = namedtuple('DigitalSnapshot', ('time', 'bits', 'values'))
+
+
+class SoftwarePwm:
+    """
+    PWM output generated by RPi.GPIO software PWM.
+    """
+    backend = 'software'
+
+    def __init__(self, gpio, frequency):
+        GPIO.setup(gpio, GPIO.OUT)
+        self._pwm = GPIO.PWM(gpio, frequency)
+
+    def start(self, duty_cycle, frequency):
+        """Starts the output at the given duty cycle (%) and frequency (Hz)."""
+        self._pwm.ChangeFrequency(frequency)
+        self._pwm.start(duty_cycle)
+
+    def stop(self):
+        """Stops the output."""
+        self._pwm.stop()
+
+    def set_duty_cycle(self, duty_cycle):
+        """Changes the duty cycle (%) of the running output."""
+        self._pwm.ChangeDutyCycle(duty_cycle)
+
+
+def make_pwm(gpio, frequency, backend):
+    """
+    Returns the PWM output for a pin, hardware PWM if selected and the pin and system support it, otherwise software
+    PWM.
+    """
+    if backend == 'hardware':
+        if gpio not in HARDWARE_PWM_CHANNELS:
+            logger.warning('GPIO %s has no hardware PWM, using software PWM', gpio)
+        else:
+            try:
+                return SysfsPwm(settings['pwm_sysfs_root'], settings['pwm_sysfs_chip'], HARDWARE_PWM_CHANNELS[gpio])
+            except OSError:
+                logger.exception('Hardware PWM is not available for GPIO %s, using software PWM', gpio)
+    return SoftwarePwm(gpio, frequency)
+
 
 class ChannelObject:
     """
@@ -54,6 +114,7 @@ class ChannelObject:
         self.name = channel_settings['name']
         self._running = 0  # used for PWM
         self.excluded = channel_settings['excluded']
+        self.pwm_backend = channel_settings.get('pwm_backend', 'software')
         try:
             self.pwm = channel_settings['pwm']
         except KeyError:
@@ -65,11 +126,27 @@ class ChannelObject:
         if self.direction == 'input':
             GPIO.setup(self.gpio, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         elif self.direction == 'output pwm':
-            GPIO.setup(self.gpio, GPIO.OUT)
-            self.gpio_pwm = GPIO.PWM(self.gpio, channel_settings['frequency'])
+            self.gpio_pwm = make_pwm(self.gpio, self.frequency, self.pwm_backend)
         else:
             GPIO.setup(self.gpio, GPIO.OUT)
 
+    def reload(self, channel_settings):
+        """
+        Applies changed channel settings in-process. The name, enable, exclusion, duty cycle and frequency change at
+        once (a running PWM output uses the new duty cycle and frequency when it is next switched on). Returns True
+        if the pin, direction or PWM backend changed, the pin must then be set up again by a restart.
+        """
+        if (channel_settings['gpio'], channel_settings['direction'],
+                channel_settings.get('pwm_backend', 'software')) != (self.gpio, self.direction, self.pwm_backend):
+            logger.warning('Digital channel "%s" pin setup changed, a restart is needed', self.name)
+            return True
+        self.name = channel_settings['name']
+        self.enabled = channel_settings['enabled']
+        self.excluded = channel_settings['excluded']
+        self.pwm = float(channel_settings.get('pwm', self.pwm))
+        self.frequency = float(channel_settings.get('frequency', self.frequency))
+        return False
+
     def write(self, value):
         """
         Sets the digital channel to the specified value if it is enabled and configured
@@ -99,8 +176,7 @@ class ChannelObject:
                     return (GPIO.input(self.gpio), 'Cannot set digital channel %s as it is excluded partner is %s'
                             % (self.name, digital_value(1)))
             if self.direction == 'output pwm':
-                self.gpio_pwm.ChangeFrequency(self.frequency)
-                self.gpio_pwm.start(self.pwm)
+                self.gpio_pwm.start(self.pwm, self.frequency)
                 self._running = True
             else:
                 GPIO.output(self.gpio, 1)
@@ -113,9 +189,33 @@ class ChannelObject:
         else:
             logger.warning('Invalid value (%s) for digital channel "%s"', value, self.name)
             return 'Invalid value (%s) for digital channel %s' % (value, self.name)
+        digital_bank.invalidate()
         logger.info('Digital Channel "%s" set to "%s"', self.name, value)
         return ''
 
+    def add_edge_callback(self, callback, bouncetime):
+        """
+        Calls callback(gpio) on both edges of an input channel, edges within bouncetime ms of the last one are
+        ignored. Returns False if edge detection could not be set up, the caller should then poll the channel.
+        """
+        if self.direction != 'input':
+            return False
+        try:
+            GPIO.add_event_detect(self.gpio, GPIO.BOTH, callback=callback, bouncetime=int(bouncetime))
+        except RuntimeError:
+            logger.exception('Edge detection could not be added for digital channel "%s"', self.name)
+            return False
+        logger.info('Edge detection added for digital channel "%s"', self.name)
+        return True
+
+    def set_duty_cycle(self, duty_cycle):
+        """
+        Changes the duty cycle of a running PWM output without changing or saving the pwm setting, so closed loop
+        control can adjust the output at its control rate. Ignored if the channel is not a running PWM output.
+        """
+        if self.direction == 'output pwm' and self._running:
+            self.gpio_pwm.set_duty_cycle(min(max(duty_cycle, 0), 100))
+
     def read(self):
         """
         Reads the current state of the GPIO pin.
@@ -149,9 +249,10 @@ class ChannelObject:
         digital_prefix = '%d' % (self.digital_id)
         settings['digital_channels'][digital_prefix][setting] = value
         writesettings()
+        digital_bank.invalidate()
         logger.info('Digital channel %s setting %s updated', self.name, setting)
 
-    def info(self):
+    def info(self, value=None):
         """
         Constructs and returns a dictionary containing detailed information about the
         current object instance.
@@ -159,18 +260,105 @@ class ChannelObject:
         The returned dictionary includes the identifier, name, direction, status of
         the object (enabled/disabled), and its current value. If the direction is set
         to 'output pwm', additional fields like pwm and frequency are also included.
+        The value is read from the GPIO unless an already read value is given.
         """
         dataval= {'%s' % settings['digital_prefix']: self.digital_id,
                   'name': self.name,
                   'direction': self.direction,
                   'enabled': self.enabled,
-                  'value': digital_value(self.read())}
+                  'value': digital_value(self.read() if value is None else value)}
         if self.direction == 'output pwm':
             dataval['pwm'] = self.pwm
             dataval['frequency'] = self.frequency
+            dataval['pwm_backend'] = self.gpio_pwm.backend
         return dataval
 
 
+class DigitalBank:
+    """
+    Bank level reads of the digital channels. A snapshot reads every enabled channel in one pass, the inputs with a
+    single lgpio group read, and is kept for max_age seconds, so all the status requests in that time (e.g. every
+    open status page) share one set of GPIO reads. Writes and setting changes invalidate the snapshot so a change is
+    shown at once.
+    """
+    def __init__(self, channels, max_age):
+        self._channels = channels  # channel id: ChannelObject, in channel order
+        self._max_age = max_age
+        self._lock = Lock()
+        self._cached = None  # (snapshot, status) of the last read
+        self._read_at = 0.0
+        self._inputs = None  # gpio numbers of the claimed input group, bit order of the group read
+
+    def invalidate(self):
+        """Discards the current snapshot, the next request reads the channels again."""
+        self._cached = None
+
+    def snapshot(self):
+        """
+        Returns the state vector of the bank: the read time, the values as bits (bit 0 is channel 1) and a tuple with
+        the value of each channel, None for disabled channels.
+        """
+        return self._refresh()[0]
+
+    def status(self):
+        """Returns the info of the enabled channels from the current snapshot, keyed by channel name."""
+        return self._refresh()[1]
+
+    def _refresh(self):
+        """
+        Returns the current (snapshot, status) pair, reading the channels if it is older than max_age. Only one thread
+        reads at a time, and the pair is returned from a local so a concurrent invalidate() cannot clear it.
+        """
+        cached = self._cached
+        if cached is not None and monotonic() - self._read_at < self._max_age:
+            return cached
+        with self._lock:
+            cached = self._cached
+            if cached is not None and monotonic() - self._read_at < self._max_age:
+                return cached
+            channels = list(self._channels.values())
+            levels = self._read_inputs()
+            values = tuple((levels[channel.gpio] if channel.gpio in levels else int(channel.read()))
+                           if channel.enabled else None for channel in channels)
+            status = {'%s%d' % (settings['digital_prefix'], channel.digital_id): channel.info(value)
+                      for channel, value in zip(channels, values) if value is not None}
+            cached = (DigitalSnapshot(time(), sum(1 << bit for bit, value in enumerate(values) if value), values),
+                      status)
+            self._read_at = monotonic()
+            self._cached = cached
+            return cached
+
+    def _claim_inputs(self):
+        """
+        Claims the input channels as one lgpio group on the gpiochip handle of rpi-lgpio (a line claimed by one handle
+        cannot be claimed by another). The pins do not change without a restart, so the group is claimed once. If
+        the claim fails the inputs are read one channel at a time.
+        """
+        inputs = [channel.gpio for channel in self._channels.values() if channel.direction == 'input']
+        self._inputs = []
+        if not inputs:
+            return
+        try:
+            lgpio.group_claim_input(GPIO._chip, inputs, lgpio.SET_PULL_UP)  # pylint: disable=protected-access
+        except (AttributeError, lgpio.error):
+            logger.exception('Digital inputs cannot be claimed as a group, reading them one at a time')
+            return
+        self._inputs = inputs
+
+    def _read_inputs(self):
+        """Reads the input group in one call, returns the level of each input keyed by gpio number."""
+        if self._inputs is None:
+            self._claim_inputs()
+        if not self._inputs:
+            return {}
+        try:
+            _, bits = lgpio.group_read(GPIO._chip, self._inputs[0])  # pylint: disable=protected-access
+        except lgpio.error:
+            logger.exception('Digital input group read failed, reading the inputs one at a time')
+            return {}
+        return {gpio: bits >> bit & 1 for bit, gpio in enumerate(self._inputs)}
+
+
 def check_digital_key(item):
     """
     Check if the given item matches a digital key based on a predefined prefix.
@@ -261,14 +449,34 @@ def digital_all_values(item, command):
              the channel's ID, name, direction, status, and whether it is enabled.
     :rtype: dict
     """
-    returned_data = {}
-    for item_id in range(1, 17):
-        if digital_channels[item_id].enabled:
-            returned_data['%s%d' % (settings['digital_prefix'], item_id)] = digital_channels[item_id].info()
-    return {'item': item, 'command': command, 'values': returned_data}
+    return {'item': item, 'command': command, 'values': dict(digital_bank.status())}
+
+
+def digital_snapshot(item, command):
+    """
+    Returns the compact state vector of all digital channels: the read time, the values as bits (bit 0 is channel 1)
+    and the value of each channel in channel order, None for disabled channels.
+    """
+    snapshot = digital_bank.snapshot()
+    return {'item': item, 'command': command,
+            'values': {'time': snapshot.time, 'bits': snapshot.bits, 'values': list(snapshot.values)}}
+
+
+def reload_digital():
+    """
+    Reloads every digital channel from the settings, registered as a settings reload hook. Returns True if any
+    channel needs a restart.
+    """
+    restart = False
+    for channel_id, channel in digital_channels.items():
+        restart = channel.reload(settings['digital_channels'][str(channel_id)]) or restart
+    digital_bank.invalidate()
+    return restart
 
 
 # setup digital channels
 digital_channels = {}
+digital_bank = DigitalBank(digital_channels, settings['digital_snapshot_max_age'])
 for i in range(1, 17):
     digital_channels[i] = ChannelObject(settings['digital_channels'][str(i)], i)
+register_reload(reload_digital, ('digital_channels', 'digital_on_value', 'digital_off_value'))
@@ -0,0 +1,213 @@
+"""
+Signal filters for sampled values
+
+This module provides the smoothing filters used for sensor readings such as the pyrometer temperature. The moving
+average, EWMA and Savitzky-Golay filters do a constant amount of work per sample, independent of their window length,
+so longer windows cost nothing extra. The median filter is O(window) per sample, see MedianFilter.
+
+Classes:
+    RingBuffer: Fixed size sample window with a running sum
+    MovingAverageFilter: Mean of the last n samples
+    EwmaFilter: Exponentially weighted moving average
+    MedianFilter: Median of the last n samples, rejects single sample spikes
+    SavitzkyGolayFilter: Quadratic least squares fit over the last n samples, evaluated at the newest sample
+
+Functions:
+    make_filter: Builds the filter selected in the settings
+"""
+from bisect import bisect_left, insort
+
+FILTERS = ('average', 'ewma', 'median', 'savitzky-golay')
+
+
+class RingBuffer:
+    """
+    A fixed size window of the most recent samples. Adding a sample overwrites the oldest one and keeps a running sum,
+    so both add() and mean() are O(1). The sum is recalculated each time the window wraps, so rounding errors cannot
+    build up.
+    """
+    def __init__(self, size, value=0.0):
+        self._size = max(int(size), 1)
+        self._samples = [value] * self._size
+        self._index = 0
+        self._sum = value * self._size
+
+    def fill(self, value):
+        """Sets every sample in the window to the given value."""
+        self._samples = [value] * self._size
+        self._index = 0
+        self._sum = value * self._size
+
+    def add(self, value):
+        """Adds a sample to the window and returns the sample it replaced."""
+        oldest = self._samples[self._index]
+        self._samples[self._index] = value
+        self._index = (self._index + 1) % self._size
+        if self._index == 0:
+            self._sum = sum(self._samples)
+        else:
+            self._sum += value - oldest
+        return oldest
+
+    def mean(self):
+        """Returns the mean of the samples in the window."""
+        return self._sum / self._size
+
+    def values(self):
+        """Returns the samples in the window, oldest first."""
+        return self._samples[self._index:] + self._samples[:self._index]
+
+    def size(self):
+        """Returns the number of samples in the window."""
+        return self._size
+
+
+class MovingAverageFilter:
+    """Mean of the last window samples."""
+    def __init__(self, window, value=0.0):
+        self._buffer = RingBuffer(window, value)
+
+    def reset(self, value):
+        """Fills the window with the given value."""
+        self._buffer.fill(value)
+
+    def add(self, value):
+        """Adds a sample and returns the filtered value."""
+        self._buffer.add(value)
+        return self._buffer.mean()
+
+    def value(self):
+        """Returns the current filtered value."""
+        return self._buffer.mean()
+
+
+class EwmaFilter:
+    """
+    Exponentially weighted moving average, each sample moves the output by alpha of the difference between the sample
+    and the previous output.
+    """
+    def __init__(self, alpha, value=0.0):
+        self._alpha = min(max(float(alpha), 0.0), 1.0)
+        self._value = value
+
+    def reset(self, value):
+        """Sets the filter output to the given value."""
+        self._value = value
+
+    def add(self, value):
+        """Adds a sample and returns the filtered value."""
+        self._value += self._alpha * (value - self._value)
+        return self._value
+
+    def value(self):
+        """Returns the current filtered value."""
+        return self._value
+
+
+class MedianFilter:
+    """
+    Median of the last window samples. The window is also kept sorted, so a sample is placed with a binary search
+    instead of sorting the window again. Removing the oldest sample and inserting the new one still shift the list,
+    which makes each sample O(window), a fast memory move for the short windows used to reject spikes.
+    """
+    def __init__(self, window, value=0.0):
+        self._buffer = RingBuffer(window, value)
+        self._sorted = [value] * self._buffer.size()
+
+    def reset(self, value):
+        """Fills the window with the given value."""
+        self._buffer.fill(value)
+        self._sorted = [value] * self._buffer.size()
+
+    def add(self, value):
+        """Adds a sample and returns the filtered value."""
+        oldest = self._buffer.add(value)
+        del self._sorted[bisect_left(self._sorted, oldest)]
+        insort(self._sorted, value)
+        return self.value()
+
+    def value(self):
+        """Returns the current filtered value."""
+        middle = len(self._sorted) // 2
+        if len(self._sorted) % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+
+class SavitzkyGolayFilter:
+    """
+    Fits a quadratic to the last window samples by least squares and returns the fit at the newest sample, smoothing
+    noise while following ramps and peaks with less lag than an average.
+
+    The fit only depends on the sums S0 = sum(y), S1 = sum(i * y) and S2 = sum(i * i * y) over the window positions i,
+    which are updated in O(1) as the window slides, and the weights applied to them are calculated once. The sums are
+    recalculated from the window each time it wraps, an amortised O(1), so rounding errors cannot build up. Windows
+    of fewer than three samples fall back to a moving average.
+    """
+    def __init__(self, window, value=0.0):
+        self._buffer = RingBuffer(window, value)
+        size = self._buffer.size()
+        self._weights = quadratic_fit_weights(size, size - 1) if size >= 3 else (1 / size, 0.0, 0.0)
+        self._added = 0  # samples added since the sums were last recalculated
+        self._sums = [0.0, 0.0, 0.0]
+        self.reset(value)
+
+    def reset(self, value):
+        """Fills the window with the given value."""
+        self._buffer.fill(value)
+        self._added = 0
+        self._resum()
+
+    def _resum(self):
+        """Calculates the sums from the samples in the window."""
+        samples = self._buffer.values()
+        self._sums = [sum(samples), sum(i * y for i, y in enumerate(samples)),
+                      sum(i * i * y for i, y in enumerate(samples))]
+
+    def add(self, value):
+        """Adds a sample and returns the filtered value."""
+        last = self._buffer.size() - 1
+        oldest = self._buffer.add(value)
+        self._added = (self._added + 1) % (last + 1)
+        if self._added == 0:
+            self._resum()
+            return self.value()
+        sum_0, sum_1, sum_2 = self._sums
+        self._sums = [sum_0 - oldest + value,
+                      sum_1 - (sum_0 - oldest) + last * value,
+                      sum_2 - 2 * sum_1 + (sum_0 - oldest) + last * last * value]
+        return self.value()
+
+    def value(self):
+        """Returns the current filtered value."""
+        return sum(weight * total for weight, total in zip(self._weights, self._sums))
+
+
+def quadratic_fit_weights(size, position):
+    """
+    Returns the weights (w0, w1, w2) that give the value at position of a quadratic least squares fit to size samples
+    at positions 0 to size - 1, as w0 * sum(y) + w1 * sum(i * y) + w2 * sum(i * i * y).
+    """
+    moments = [sum(i ** power for i in range(size)) for power in range(5)]
+    matrix = [[moments[row + column] for column in range(3)] for row in range(3)]
+    determinant = (matrix[0][0] * (matrix[1][1] * matrix[2][2] - matrix[1][2] * matrix[2][1]) -
+                   matrix[0][1] * (matrix[1][0] * matrix[2][2] - matrix[1][2] * matrix[2][0]) +
+                   matrix[0][2] * (matrix[1][0] * matrix[2][1] - matrix[1][1] * matrix[2][0]))
+    inverse = [[(matrix[(column + 1) % 3][(row + 1) % 3] * matrix[(column + 2) % 3][(row + 2) % 3] -
+                 matrix[(column + 1) % 3][(row + 2) % 3] * matrix[(column + 2) % 3][(row + 1) % 3]) / determinant
+                for column in range(3)] for row in range(3)]
+    basis = (1, position, position * position)
+    return tuple(sum(basis[row] * inverse[row][column] for row in range(3)) for column in range(3))
+
+
+def make_filter(name, window, alpha, value=0.0):
+    """
+    Builds the filter selected by name, one of FILTERS. Unknown names fall back to the moving average.
+    """
+    if name == 'ewma':
+        return EwmaFilter(alpha, value)
+    if name == 'median':
+        return MedianFilter(window, value)
+    if name == 'savitzky-golay':
+        return SavitzkyGolayFilter(window, value)
+    return MovingAverageFilter(window, value)
@@ -6,16 +6,39 @@ including interlocks for door and key switch states. It contains utility to moni
 hardware statuses and perform necessary operations, such as enabling and disabling
 the laser based on safety conditions.
 
+The door and key interlocks are edge triggered: GPIO edge callbacks drop the laser enable output as soon as an
+interlock breaks, and the time from the edge to the enable output dropping is measured and reported in the laser
+status. A slow periodic re-check remains as a safety net.
+
 The laser power is managed by pulse width modulation (PWM) output on a digital channel.
 The laser is automatically turned off after a specified timeout period if it is not
-shut down by API control.
+shut down by API control. The timeout and the interlock checks run on the shared scheduler,
+the timeout is cancelled when the laser is switched off.
+
+The laser is modelled as a state machine with the states Disabled (interlocks open), Standby (interlocks closed,
+laser off), Firing and Fault (an interlock opened while firing, cleared by switching the laser off). Every
+transition runs under one lock, so the interlock callbacks, the scheduler and any number of request threads see a
+consistent state, and each transition publishes a new immutable, versioned snapshot. Readers such as laser_status
+and http_status_data use the latest snapshot and never wait for the lock.
 """
-from threading import Thread
-from time import time, sleep
+from collections import namedtuple
+from threading import Lock
+from time import perf_counter, time
+from datetime import datetime
 from digital_class import digital_channels
-from serial_class import serial_channels
+from pyrometer_class import pyrometer
+from timeseries_class import history
+from scheduler_class import scheduler
 from logmanager import logger
-from app_control import settings, writesettings
+from app_control import settings, writesettings, register_reload
+
+DISABLED = 'Disabled'
+STANDBY = 'Standby'
+FIRING = 'Firing'
+FAULT = 'Fault'
+
+LaserSnapshot = namedtuple('LaserSnapshot', ('version', 'state', 'enabled', 'door', 'key', 'power', 'output',
+                                             'maxtime', 'since'))
 
 
 class LaserObject:
@@ -43,76 +66,181 @@ class LaserObject:
         self._key_switch_ch = 13
         self._door_switch_ch = 14
         self._laser_enable_ch = 16
-        self._laser_state = 0
-        self._laser_enabled = 0
-        self._key_state = 1
-        self._door_state = 1
-        self._laser_max_time = settings['laser-maxtime']
-        self.interlock_monitor_thread = Thread(target=self.interlock_monitor)
-        self.interlock_monitor_thread.name = 'Laser safety interlock monitor thread'
-        self.interlock_monitor_thread.start()
+        self._lock = Lock()
+        self._snapshot = LaserSnapshot(version=0, state=DISABLED, enabled=0, door=1, key=1,
+                                       power=digital_channels[self._laser_pwm_ch].pwm, output=None,
+                                       maxtime=settings['laser-maxtime'], since=time())
+        self._off_timer = None
+        self._session = None
+        self._interlock_stats = {'trips': 0, 'last_reaction_ms': None, 'max_reaction_ms': None,
+                                 'mean_reaction_ms': None, 'missed_edges': 0, 'last_trip': ''}
+        self._edge_detection = (
+            digital_channels[self._door_switch_ch].add_edge_callback(self.interlock_edge,
+                                                                     settings['interlock-debounce-ms']) and
+            digital_channels[self._key_switch_ch].add_edge_callback(self.interlock_edge,
+                                                                    settings['interlock-debounce-ms']))
+        history.register_source('laser_state', lambda: int(self._snapshot.state == FIRING))
+        history.register_source('laser_enabled', lambda: self._snapshot.enabled)
+        history.register_source('laser_power', self.power_output)
+        history.register_source('door', lambda: self._snapshot.door)
+        history.register_source('key', lambda: self._snapshot.key)
+        self.update_interlocks()
+        self._interlock_check = scheduler.call_every(settings['interlock-recheck'] if self._edge_detection else 0.5,
+                                                     self.update_interlocks)
+        register_reload(self.reload_settings, ('laser-maxtime',))
+
+    def reload_settings(self):
+        """
+        Settings reload hook, picks up a changed laser power or timeout. The power is applied when the laser is next
+        switched on.
+        """
+        with self._lock:
+            self._publish(power=digital_channels[self._laser_pwm_ch].pwm, maxtime=settings['laser-maxtime'])
+        return False
+
+    def snapshot(self):
+        """Returns the latest laser state snapshot, without waiting for a transition in progress."""
+        return self._snapshot
+
+    def _publish(self, **changes):
+        """
+        Publishes a new snapshot with the given fields changed and the version incremented. Must be called with the
+        lock held.
+        """
+        snapshot = self._snapshot
+        if 'state' in changes and changes['state'] != snapshot.state:
+            changes['since'] = time()
+            logger.info('LaserClass Laser state %s -> %s', snapshot.state, changes['state'])
+        self._snapshot = snapshot._replace(version=snapshot.version + 1, **changes)
 
     def check_door_state(self):
         """Returns a 0 for door closed and 1 for door open alarm, door switch will ground te GPIO pin so will generate
-         a 0 for closed and a 1 for open. Sets the door LED to show it is closed (on) or open (off)."""
+         a 0 for closed and a 1 for open. Sets the door LED to show it is closed (on) or open (off). Must be called
+         with the lock held."""
         door_state = digital_channels[self._door_switch_ch].read()
-        if self._door_state != door_state:
-            self._door_state = door_state
-            if self._door_state == 0:
+        if self._snapshot.door != door_state:
+            self._publish(door=door_state)
+            if door_state == 0:
                 digital_channels[self._door_led_ch].write(settings['digital_on_command'])
             else:
                 digital_channels[self._door_led_ch].write(settings['digital_off_command'])
-            logger.info('LaserClass Door State has changed to = %i', self._door_state)
-        return self._door_state
+            logger.info('LaserClass Door State has changed to = %i', door_state)
+        return door_state
 
     def check_key_state(self):
-        """Returns a 1 for key switch closed and 0 for key switch open"""
+        """Returns a 0 for key switch on and 1 for key switch off alarm. Must be called with the lock held."""
         key_state = int(not digital_channels[self._key_switch_ch].read())  # Invert the key switch state
-        if self._key_state != key_state:
-            self._key_state = key_state
-            logger.info('LaserClass Key State has changed to = %i', self._key_state)
-        return self._key_state
-
-    def interlock_monitor(self):
-        """
-        Monitors the state of the door and key inputs, and controls the laser enable
-        state based on their statuses. This method performs continuous checks and
-        updates the states accordingly by interacting with GPIO channels. Both door
-        and key states should be 0 (not alarming) for the laser to be enabled.
-        """
-        while True:
-            if self.check_door_state() + self.check_key_state() == 0:
-                if self._laser_enabled == 0:
-                    self._laser_enabled = 1
-                    logger.info('LaserClass Laser is enabled')
-                    digital_channels[self._laser_enable_ch].write(digital_convertor(self._laser_enabled))
+        if self._snapshot.key != key_state:
+            self._publish(key=key_state)
+            logger.info('LaserClass Key State has changed to = %i', key_state)
+        return key_state
+
+    def interlock_edge(self, _gpio):
+        """
+        GPIO edge callback for the door and key inputs. The interlocks are updated immediately and
+        checked again once the debounce time has passed, so the final state after any contact bounce
+        is always applied. The periodic re-check every interlock-recheck seconds (0.5 seconds if edge
+        detection is not available) is the safety net for missed edges.
+        """
+        self.update_interlocks(perf_counter())
+        scheduler.call_later(settings['interlock-debounce-ms'] / 1000, self.update_interlocks)
+
+    def update_interlocks(self, edge_time=None):
+        """
+        Controls the laser enable output from the door and key inputs. Both door and key states
+        should be 0 (not alarming) for the laser to be enabled. When an interlock break disables the
+        laser the reaction time from the GPIO edge is recorded, a break found without an edge is
+        counted as a missed edge.
+        """
+        with self._lock:
+            self._apply_interlocks(edge_time)
+
+    def _apply_interlocks(self, edge_time=None):
+        """
+        Reads the interlocks and makes the interlock transitions: Disabled to Standby when both close, Standby to
+        Disabled and Firing to Fault when either opens. Must be called with the lock held.
+        """
+        snapshot = self._snapshot
+        if self.check_door_state() + self.check_key_state() == 0:
+            if not snapshot.enabled:
+                digital_channels[self._laser_enable_ch].write(digital_convertor(1))
+                self._publish(enabled=1, state=STANDBY if snapshot.state == DISABLED else snapshot.state)
+                logger.info('LaserClass Laser is enabled')
+        elif snapshot.enabled:
+            digital_channels[self._laser_enable_ch].write(digital_convertor(0))
+            if snapshot.state == FIRING:
+                self._switch_off()
+                self._publish(enabled=0, state=FAULT)
+                logger.warning('LaserClass Interlock opened while firing, laser switched off')
             else:
-                if self._laser_enabled == 1:
-                    self._laser_enabled = 0
-                    logger.info('LaserClass Laser is disabled')
-                    digital_channels[self._laser_enable_ch].write(self._laser_enabled)
-            sleep(0.5)
+                self._publish(enabled=0, state=DISABLED if snapshot.state == STANDBY else snapshot.state)
+            self.record_interlock_trip(edge_time)
+            logger.info('LaserClass Laser is disabled')
+
+    def record_interlock_trip(self, edge_time):
+        """Updates the interlock reaction time statistics after the laser has been disabled."""
+        stats = self._interlock_stats
+        stats['trips'] += 1
+        stats['last_trip'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if edge_time is None:
+            stats['missed_edges'] += 1
+            logger.warning('LaserClass interlock break found by the periodic check, no edge was detected')
+            return
+        reaction = round((perf_counter() - edge_time) * 1000, 3)
+        timed_trips = stats['trips'] - stats['missed_edges']
+        stats['last_reaction_ms'] = reaction
+        stats['max_reaction_ms'] = max(stats['max_reaction_ms'] or 0, reaction)
+        stats['mean_reaction_ms'] = round(((stats['mean_reaction_ms'] or 0) * (timed_trips - 1) + reaction)
+                                          / timed_trips, 3)
+        logger.info('LaserClass interlock reaction time %s ms', reaction)
+
+    def firing(self):
+        """Returns True while the laser is switched on."""
+        return self._snapshot.state == FIRING
+
+    def enabled(self):
+        """Returns True while the key and door interlocks allow the laser to fire."""
+        return self._snapshot.enabled == 1
+
+    def set_power_output(self, power):
+        """
+        Sets the laser PWM duty cycle (%) while the laser is firing without changing the saved power setting, used by
+        the temperature controller. None returns the laser to the saved power setting.
+        """
+        with self._lock:
+            self._publish(output=power)
+            if self._snapshot.state == FIRING:
+                digital_channels[self._laser_pwm_ch].set_duty_cycle(self._snapshot.power if power is None else power)
+
+    def power_output(self):
+        """Returns the laser power (%) currently applied, the controller output or the saved power setting."""
+        snapshot = self._snapshot
+        if snapshot.output is None:
+            return snapshot.power
+        return snapshot.output
 
     def laser_status(self, item, command, exception=None):
         """Returns the current laser power level."""
+        snapshot = self._snapshot
+        values = {'laser': int(snapshot.state == FIRING), 'laser_enabled': snapshot.enabled, 'power': snapshot.power,
+                  'door': snapshot.door, 'key': snapshot.key, 'laser_maxtime': snapshot.maxtime,
+                  'state': snapshot.state, 'state_since': snapshot.since, 'version': snapshot.version,
+                  'interlock': dict(self._interlock_stats)}
         if exception:
-            return {'item': item, 'command': command, 'exception': exception,
-                    'values': {'laser': digital_channels[self._laser_pwm_ch].read(),
-                    'laser_enabled': self._laser_enabled, 'power': digital_channels[self._laser_pwm_ch].pwm,
-                    'door': self._door_state, 'key': self._key_state, 'laser_maxtime': self._laser_max_time}}
-        return {'item': item, 'command': command, 'values': {'laser': digital_channels[self._laser_pwm_ch].read(),
-                                                                  'laser_enabled': self._laser_enabled,
-                                                                  'power': digital_channels[self._laser_pwm_ch].pwm,
-                                                                  'door': self._door_state, 'key': self._key_state,
-                                                             'laser_maxtime': self._laser_max_time}}
+            return {'item': item, 'command': command, 'exception': exception, 'values': values}
+        return {'item': item, 'command': command, 'values': values}
 
     def set_laser_power(self, item, command):
-        """Sets the laser power level based on the given value."""
+        """Sets the laser power level based on the given value, a firing laser changes to the new power at once."""
         if command > 100:
             command = 100
         elif command < 0:
             command = 0
-        digital_channels[self._laser_pwm_ch].change_setting('pwm', command)
+        with self._lock:
+            digital_channels[self._laser_pwm_ch].change_setting('pwm', command)
+            self._publish(power=digital_channels[self._laser_pwm_ch].pwm)
+            if self._snapshot.state == FIRING and self._snapshot.output is None:
+                digital_channels[self._laser_pwm_ch].set_duty_cycle(self._snapshot.power)
         logger.info('LaserClass Laser power level set to %i', command)
         return self.laser_status(item, command)
 
@@ -122,76 +250,97 @@ class LaserObject:
             command = 900
         elif command < 60:
             command = 60
-        self._laser_max_time = command
-        settings['laser-maxtime'] = command
+        with self._lock:
+            self._publish(maxtime=command)
+            settings['laser-maxtime'] = command
         writesettings()
         logger.info('LaserClass Laser timeout set to %i', command)
         return self.laser_status(item, command)
 
-    def laser_off_timer(self):
+    def laser_timeout(self, session):
         """
-        Sets a timer to automatically turn off the laser after a specified maximum time is reached.
-        This method checks if the laser is currently on. If the laser is on, it calculates
-        a future time based on the current time and the maximum allowed time. The laser
-        will then be turned off after the calculated duration has passed.
+        Called by the scheduler when the laser has been on for the maximum time, turns the laser off. The session is
+        the snapshot version at which the laser was switched on, so a timeout can never switch off a later session.
         """
-        off_time = time() + self._laser_max_time
-        while self._laser_state == 1:
-            if time() > off_time:
-                self.laser_on_off('auto-laser-off', 0)
-                logger.info('LaserClass Laser has been turned off due to timeout')
-            sleep(1)
+        with self._lock:
+            if self._snapshot.state != FIRING or self._session != session:
+                return
+            self._switch_off()
+            self._publish(state=STANDBY if self._snapshot.enabled else DISABLED)
+        logger.info('LaserClass Laser has been turned off due to timeout')
+
+    def _switch_off(self):
+        """Switches the laser outputs off and cancels the timeout. Must be called with the lock held."""
+        if self._off_timer is not None:
+            self._off_timer.cancel()
+            self._off_timer = None
+        self._session = None
+        pyrometer.burst_mode(False)
+        digital_channels[self._laser_pwm_ch].write(settings['digital_off_command'])
+        digital_channels[self._laser_warning_ch].write(settings['digital_off_command'])
 
     def laser_on_off(self, item, command):
         """
-        Handles the operation of a laser based on the given state. The method accordingly
-        ensures the required conditions are met for turning the laser on. If the state
-        is turned on, timers are initialized to regulate automatic shutdowns of the laser.
-        If the state is turned off, the laser components and associated digital channels
-        are duly deactivated.
-        """
-        if command == 1:
-            if self.check_door_state() + self.check_key_state() != 2:
-                logger.warning('LaserClass Laser was not switched on as key is off door open')
-                self._laser_state = 0
-                return self.laser_status(item, command, 'Key off or door open')
-            logger.info('LaserClass Switching laser on')
-            serial_channels['pyrometer'].change_poll_interval(1)
-            digital_channels[self._laser_pwm_ch].write(settings['digital_on_command'])
-            digital_channels[self._laser_warning_ch].write(settings['digital_on_command'])
-            self._laser_state = 1
-            # Start a  timer for the laser, if the laser is not shutdown this timer will shut it down
-            timerthread = Thread(target=self.laser_off_timer)
-            timerthread.name = 'laser-off-timer-thread'
-            timerthread.start()
-        else:
-            serial_channels['pyrometer'].change_poll_interval(0)
-            logger.info('LaserClass Laser is off')
-            self._laser_state = 0
-            digital_channels[self._laser_pwm_ch].write(settings['digital_off_command'])
-            digital_channels[self._laser_warning_ch].write(settings['digital_off_command'])
+        Switches the laser on (Standby to Firing) or off (Firing or Fault to Standby or Disabled). The interlocks are
+        read again before the laser is switched on, and the laser only fires from Standby. Switching on a firing laser
+        restarts its timeout, switching the laser off also clears a fault.
+        """
+        with self._lock:
+            if command == 1:
+                self._apply_interlocks()
+                state = self._snapshot.state
+                if state == FAULT:
+                    logger.warning('LaserClass Laser was not switched on as it is in fault, switch it off to reset')
+                    exception = 'Laser fault, switch the laser off to reset'
+                elif state == DISABLED:
+                    logger.warning('LaserClass Laser was not switched on as key is off door open')
+                    exception = 'Key off or door open'
+                else:
+                    exception = ''
+                    if state == STANDBY:
+                        logger.info('LaserClass Switching laser on')
+                        pyrometer.burst_mode(True)
+                        digital_channels[self._laser_pwm_ch].write(settings['digital_on_command'])
+                        digital_channels[self._laser_warning_ch].write(settings['digital_on_command'])
+                        if self._snapshot.output is not None:
+                            digital_channels[self._laser_pwm_ch].set_duty_cycle(self._snapshot.output)
+                        self._publish(state=FIRING)
+                    # Start a timer for the laser, if the laser is not shutdown this timer will shut it down
+                    if self._off_timer is not None:
+                        self._off_timer.cancel()
+                    self._session = self._snapshot.version
+                    self._off_timer = scheduler.call_later(self._snapshot.maxtime, self.laser_timeout,
+                                                           self._session)
+                if exception:
+                    return self.laser_status(item, command, exception)
+            else:
+                self._switch_off()
+                self._publish(state=STANDBY if self._snapshot.enabled else DISABLED)
+                logger.info('LaserClass Laser is off')
         return self.laser_status(item, command)
 
     def http_status_data(self, item, command):
         """Returns a formatted dictionary of laser status data for the index page."""
+        snapshot = self._snapshot
         http_data = {'item': item, 'command': command, 'values': {}}
-        if self._key_state == 0:
+        if snapshot.key == 0:
             http_data['values']['key'] = {'name': 'Key', 'direction': 'input', 'value': 'Key on', 'enabled': True}
         else:
             http_data['values']['key'] = {'name': 'Key', 'direction': 'input', 'value': 'Key off', 'enabled': True}
-        if self._door_state == 0:
+        if snapshot.door == 0:
             http_data['values']['door'] = {'name': 'Door', 'direction': 'input', 'value': 'Closed', 'enabled': True}
         else:
             http_data['values']['door'] = {'name': 'Door', 'direction': 'input', 'value': 'Open', 'enabled': True}
-        if self._laser_enabled == 1:
-            if self._laser_state == 1:
-                http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output pwm', 'value': 'Firing', 'enabled': True}
-            else:
-                http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output', 'value': 'Standby', 'enabled': True}
+        if snapshot.state == FIRING:
+            http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output pwm', 'value': 'Firing', 'enabled': True}
+        elif snapshot.state == STANDBY:
+            http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output', 'value': 'Standby', 'enabled': True}
+        elif snapshot.state == FAULT:
+            http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output', 'value': 'Fault', 'enabled': True}
         else:
             http_data['values']['laser'] = {'name': 'Laser', 'direction': 'output', 'value': 'Power off', 'enabled': True}
         http_data['values']['power'] = {'name': 'Laser Power', 'direction': 'setting',
-                                             'value': '%s %%' % digital_channels[self._laser_pwm_ch].pwm, 'enabled': True}
+                                             'value': '%s %%' % snapshot.power, 'enabled': True}
         return http_data
 
 def digital_convertor(value):
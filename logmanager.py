@@ -8,7 +8,7 @@ logging across all application components.
 Features:
     - Standardized log formatting
     - File-based logging with rotation
-    - Log level management
+    - Log level management, the level is changed in-process when the loglevel setting changes
     - Thread-safe logging operations
 
 Exports:
@@ -35,7 +35,7 @@ import os
 import sys
 import logging
 from logging.handlers import RotatingFileHandler
-from app_control import settings
+from app_control import settings, register_reload
 
 # Ensure log directory exists
 log_dir = os.path.dirname(settings['logfilepath'])
@@ -50,14 +50,20 @@ Usage:\n
 **logger.error('message')** for errors
 """
 
-if settings['loglevel'].upper() == 'DEBUG':
-    logger.setLevel(logging.DEBUG)
-else:
-    logger.setLevel(logging.INFO)
+
+def apply_log_level():
+    """Sets the logger level from the loglevel setting, registered as a settings reload hook."""
+    level = logging.DEBUG if settings['loglevel'].upper() == 'DEBUG' else logging.INFO
+    if logger.level != level:
+        logger.setLevel(level)
+        logger.info('Logging level set to: %s', logging.getLevelName(level))
+    return False
+
 
 LogFile = RotatingFileHandler(settings['logfilepath'], maxBytes=1048576, backupCount=10)
 formatter = logging.Formatter('[%(asctime)s] - [%(levelname)s] - %(message)s')
 LogFile.setFormatter(formatter)
 logger.addHandler(LogFile)
+apply_log_level()
+register_reload(apply_log_level, ('loglevel',))
 logger.info('Runnng Python %s on %s', sys.version, sys.platform)
-logger.info('Logging level set to: %s', settings['loglevel'].upper())
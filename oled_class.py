@@ -22,9 +22,10 @@ Usage:
 """
 
 from config_class import get_netifo
-from app_control import settings, VERSION
+from app_control import settings, VERSION, register_reload
 from logmanager import logger
-if settings['oled_enabled']:
+OLED_LOADED = settings['oled_enabled']  # the display libraries are only loaded if the display is enabled at start up
+if OLED_LOADED:
     import board
     from PIL import Image, ImageDraw, ImageFont
     import adafruit_ssd1306
@@ -73,5 +74,19 @@ def set_oled():
         oled.image(image)
         oled.show()
 
+
+def reload_oled():
+    """
+    Settings reload hook, returns True if the display has been enabled but its libraries were not loaded at start
+    up, which needs a restart. The display itself is redrawn by set_oled.
+    """
+    if settings['oled_enabled'] and not OLED_LOADED:
+        logger.warning('OLED display enabled, a restart is needed to load the display libraries')
+        return True
+    return False
+
+
+register_reload(reload_oled, ('oled_enabled',))
+
 if __name__ == "__main__":
     set_oled()
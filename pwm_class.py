@@ -0,0 +1,70 @@
+"""
+Hardware PWM through the kernel sysfs interface
+
+This module drives the PWM peripheral of the Raspberry Pi through /sys/class/pwm, which is jitter free and uses no
+CPU. It only needs the sysfs files, not RPi.GPIO, so digital_class selects it per channel (the pwm_backend setting)
+and it can be exercised against a stand-in sysfs directory.
+
+Classes:
+    SysfsPwm: PWM output of one PWM peripheral channel
+
+Attributes:
+    HARDWARE_PWM_CHANNELS: The GPIO pins the PWM peripheral can drive, and the peripheral channel of each
+"""
+import os
+from time import sleep
+
+HARDWARE_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}  # GPIO pin: PWM peripheral channel
+EXPORT_TIMEOUT = 1  # seconds to wait for an exported PWM channel to appear
+
+
+class SysfsPwm:
+    """
+    PWM output generated by the PWM peripheral through the kernel sysfs interface. The period and duty cycle are
+    written in nanoseconds to <root>/<chip>/pwm<channel>, the channel is exported first if necessary.
+    """
+    backend = 'hardware'
+
+    def __init__(self, root, chip, channel):
+        chip_path = os.path.join(root, chip)
+        self._path = os.path.join(chip_path, 'pwm%d' % channel)
+        self._period = 0
+        self._duty = 0
+        if not os.path.isdir(self._path):
+            with open(os.path.join(chip_path, 'export'), 'w', encoding='ascii') as export_file:
+                export_file.write('%d' % channel)
+            waited = 0
+            while not os.access(os.path.join(self._path, 'enable'), os.W_OK):  # udev sets the permissions
+                if waited >= EXPORT_TIMEOUT:
+                    raise OSError('PWM channel %s was not exported' % self._path)
+                sleep(0.05)
+                waited += 0.05
+
+    def _write(self, name, value):
+        with open(os.path.join(self._path, name), 'w', encoding='ascii') as pwm_file:
+            pwm_file.write('%d' % value)
+
+    def start(self, duty_cycle, frequency):
+        """Starts the output at the given duty cycle (%) and frequency (Hz)."""
+        period = int(round(1e9 / frequency))
+        duty = int(round(period * min(max(duty_cycle, 0), 100) / 100))
+        if period != self._period:
+            if self._duty > period:  # the duty cycle may never be longer than the period
+                self._write('duty_cycle', 0)
+                self._duty = 0
+            self._write('period', period)
+            self._period = period
+        self._write('duty_cycle', duty)
+        self._duty = duty
+        self._write('enable', 1)
+
+    def stop(self):
+        """Stops the output."""
+        self._write('enable', 0)
+
+    def set_duty_cycle(self, duty_cycle):
+        """Changes the duty cycle (%) of the running output."""
+        duty = int(round(self._period * min(max(duty_cycle, 0), 100) / 100))
+        if duty != self._duty:
+            self._write('duty_cycle', duty)
+            self._duty = duty
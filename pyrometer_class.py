@@ -4,11 +4,25 @@ Module for managing operations of a Micro Epsilon Infrared Pyrometer.
 This module contains the `PyrometerObject` class which encapsulates various
 pyrometer operations including temperature readings, managing rangefinder laser control,
 and tracking the running average and maximum temperature.
+
+The running average is smoothed with the filter selected in settings['pyro-filter'] ('average', 'ewma',
+'median' or 'savitzky-golay', see filter_class). The filter is fed on a fixed time base, one value per
+settings['pyro-ui-interval'] seconds, so its window of settings['pyro-running-average'] values always covers the same
+time however fast the channel polls.
+
+While the laser fires the pyrometer runs a burst: the temperature is polled back to back as fast as the
+instrument replies. Every reading is kept at full resolution for recording, while a background pipeline
+downsamples the readings to one averaged value per settings['pyro-ui-interval'] seconds for the display.
 """
 
 from threading import Thread
-from time import time, sleep
+from time import time
+from queue import Queue, Empty
+from collections import deque
 from serial_class import serial_channels
+from filter_class import make_filter
+from timeseries_class import history
+from scheduler_class import scheduler
 from logmanager import logger
 from app_control import settings
 
@@ -38,66 +52,101 @@ class PyrometerObject:
         self._max_temp = settings['pyro-min-temp']
         self._average_max_temp = settings['pyro-min-temp']
         self._current_temp = settings['pyro-min-temp']
-        self._temperature_sequence = [settings['pyro-min-temp']] * settings['pyro-running-average']
+        self._current_time = 0
+        self._temperature_filter = make_filter(settings['pyro-filter'], settings['pyro-running-average'],
+                                               settings['pyro-ewma-alpha'], settings['pyro-min-temp'])
         self._laser_state = 0
-        self._default_poll_interval = 5
-        self._poll_interval =  self._default_poll_interval
         self._laser_max_time = settings['laser-maxtime']
-        timerthread = Thread(target=self.pyrometer_updater)
-        timerthread.name = 'pyro reader thread'
-        timerthread.start()
+        self._off_timer = None
+        self._samples = Queue()
+        self._bursting = False
+        self._burst_record = deque(maxlen=settings['pyro-burst-samples'])
+        pipelinethread = Thread(target=self.sample_pipeline, daemon=True)
+        pipelinethread.name = 'pyro sample pipeline thread'
+        pipelinethread.start()
+        serial_channels['pyrometer'].subscribe(self.pyrometer_update)
 
-    def pyrometer_updater(self):
+    def pyrometer_update(self, pyro_values):
         """
-        Continuously updates pyrometer data and moving average based on a defined polling interval.
+        Called by the pyrometer serial channel each time a poll completes. The reading is queued for the sample
+        pipeline so the serial thread can go straight back to polling.
         """
-        while True:
-            sleep_counter = 0
-            self.read_pyrometer_data()
-            self.update_moving_average()
-            while sleep_counter < self._poll_interval:
-                sleep_counter += 1
-                sleep(1)
+        self._samples.put((time(), pyro_values))
 
-    def read_pyrometer_data(self):
+    def sample_pipeline(self):
+        """
+        Processes the queued readings. The current and maximum temperatures follow every reading and burst readings
+        are recorded at full resolution. The moving average is updated once per display interval with the mean of
+        the readings received in that interval, or with the latest reading if none arrived, so adaptive and burst
+        polling do not change the time the filter window covers.
+        """
+        block_sum = 0
+        block_count = 0
+        emit_time = time() + settings['pyro-ui-interval']
+        while True:
+            try:
+                read_time, pyro_values = self._samples.get(timeout=max(emit_time - time(), 0))
+                self.read_pyrometer_data(pyro_values)
+                self._current_time = read_time
+                self._max_temp = max(self._max_temp, self._current_temp)
+                history.record('temperature', self._current_temp, read_time)
+                if self._bursting:
+                    self._burst_record.append((read_time, self._current_temp))
+                block_sum += self._current_temp
+                block_count += 1
+            except Empty:
+                pass
+            now = time()
+            if now >= emit_time:
+                self.update_moving_average(block_sum / block_count if block_count else self._current_temp)
+                block_sum = 0
+                block_count = 0
+                emit_time += settings['pyro-ui-interval']
+                if emit_time <= now:  # the pipeline fell behind, restart the time base rather than catch up
+                    emit_time = now + settings['pyro-ui-interval']
+
+    def read_pyrometer_data(self, pyro_values):
         """
         Calculates the temperature and laser state from the pyrometer data. The method processes
-        the serial listener values associated with the pyrometer channel. It extracts and decodes
-        the temperature and laser state values from the corresponding data entries and updates the class.
+        the serial listener values associated with the pyrometer channel. Messages defined with a field format
+        arrive as numbers and are used directly, older message definitions are still decoded from the raw string.
         """
-        pyro_values = serial_channels['pyrometer'].listener_values()
         for value in pyro_values:
             if value['name'] == 'temperature':
+                if isinstance(value['value'], (int, float)):
+                    self._current_temp = value['value']
+                    continue
                 try:
                     binary_1 = value['value'].encode('iso-8859-1')
                     self._current_temp  = ((binary_1[0] * 256 + binary_1[1]) - 1000) / 10
                 except IndexError:
                     self._current_temp = settings['pyro-min-temp']
             if value['name'] == 'pyrometer laser':
+                if isinstance(value['value'], int):
+                    self._laser_state = value['value']
+                    continue
                 try:
                     binary_1 = value['value'].encode('iso-8859-1')
                     self._laser_state = int(binary_1[0])
                 except IndexError:
                     self._laser_state = 0
 
-    def update_moving_average(self):
+    def update_moving_average(self, temperature):
         """
         Updates the running average temperature and maintains tracking of the maximum average
-        temperature observed. The function adjusts the list of temperature readings depending
-        on the current temperature value and predetermined settings. It also calculates a new
-        average temperature from the updated list and compares it with the maximum average
-        temperature recorded so far.
-        """
-        self._max_temp = max(self._max_temp, self._current_temp)
-        if self._current_temp  <= settings['pyro-min-temp']:
-            self._temperature_sequence = [settings['pyro-min-temp']] * settings['pyro-running-average']
-        elif self._current_temp  > (self._average_temp + 20):  # speed up getting to average while sample is heating
-            self._temperature_sequence = [self._current_temp ] * settings['pyro-running-average']
+        temperature observed. The temperature filter is reset depending on the temperature
+        value and predetermined settings, otherwise the temperature is added to the filter. Each update
+        takes the same time whatever the filter window.
+        """
+        if temperature <= settings['pyro-min-temp']:
+            self._temperature_filter.reset(settings['pyro-min-temp'])
+        elif temperature > (self._average_temp + 20):  # speed up getting to average while sample is heating
+            self._temperature_filter.reset(temperature)
         else:
-            self._temperature_sequence.append(self._current_temp)
-            self._temperature_sequence.pop(0)
-        self._average_temp = float(sum(self._temperature_sequence) / len(self._temperature_sequence))
+            self._temperature_filter.add(temperature)
+        self._average_temp = float(self._temperature_filter.value())
         self._average_max_temp = max(self._average_temp, self._average_max_temp)
+        history.record('average_temperature', self._average_temp)
 
     def reset_max(self, item, command):
         """
@@ -112,39 +161,62 @@ class PyrometerObject:
         self._average_max_temp = settings['pyro-min-temp']
         return self.get_temperatures(item, command)
 
+    def latest_temperature(self):
+        """
+        Returns the latest temperature reading and the time it was read, for closed loop control.
+        """
+        return self._current_temp, self._current_time
+
+    def burst_mode(self, active):
+        """
+        Starts or stops burst acquisition of the temperature, called when the main laser is switched on or off. A new
+        burst replaces the recording of the previous one.
+        """
+        if active and not self._bursting:
+            self._burst_record.clear()
+        self._bursting = bool(active)
+        serial_channels['pyrometer'].set_active(active)
+        serial_channels['pyrometer'].set_burst(active, ('temperature',))
+
+    def burst_data(self, item, command):
+        """
+        Returns the full resolution temperature readings of the current or last burst as [time, temperature] pairs,
+        only the readings after the timestamp given as the command if it is not 0.
+        """
+        since = float(command or 0)
+        samples = [[read_time, temperature] for read_time, temperature in list(self._burst_record) if read_time > since]
+        return {'item': item, 'command': command, 'values': {'bursting': self._bursting, 'samples': samples}}
+
     def laser_on_off(self, item, command):
         """
         Controls the laser of the pyrometer by turning it on or off based on the
-        provided command. When the laser is turned on, a timer thread is initiated
-        to handle turning it off after a certain duration set in the settings file.
+        provided command. When the laser is turned on, a timer is scheduled to turn
+        it off after a certain duration set in the settings file, the timer is
+        cancelled when the laser is turned off.
         """
+        if self._off_timer is not None:
+            self._off_timer.cancel()
+            self._off_timer = None
         if command == 1:
             serial_channels['pyrometer'].api_command(item, 'pyrolaser-on')
             self._laser_state = 1
             logger.info('PyroClass Rangefinder laser is on')
-            timerthread = Thread(target=self.laser_off_timer)
-            timerthread.name = 'pyro-rangefinder-off-timer-thread'
-            timerthread.start()
+            self._off_timer = scheduler.call_later(self._laser_max_time, self.laser_timeout)
         else:
             serial_channels['pyrometer'].api_command(item, 'pyrolaser-off')
             self._laser_state = 0
             logger.info('PyroClass Rangefinder laser is off')
         return self.get_temperatures(item, command)
 
-    def laser_off_timer(self):
+    def laser_timeout(self):
         """
-        Sets a timer to automatically turn off the laser after a specified maximum time is reached.
-
-        This method checks if the laser is currently on. If the laser is on, it calculates
-        a future time based on the current time and the maximum allowed time. The laser
-        will then be turned off after the calculated duration has passed.
+        Called by the scheduler when the rangefinder laser has been on for the maximum time, turns it off. The off
+        command is queued without waiting for the reply, as scheduler jobs must not block.
         """
-        off_time = time() + self._laser_max_time
-        while self._laser_state == 1:
-            if time() > off_time:
-                self.laser_on_off('autolaseroff', 0)
-                logger.info('PyroClass Rangefinder laser has been turned off due to timeout')
-            sleep(1)
+        self._off_timer = None
+        serial_channels['pyrometer'].api_command('autolaseroff', 'pyrolaser-off', wait=False)
+        self._laser_state = 0
+        logger.info('PyroClass Rangefinder laser has been turned off due to timeout')
 
     def get_temperatures(self, item, command):
         """
@@ -159,13 +231,4 @@ class PyrometerObject:
                   'averagemaxtemp': self._average_max_temp, 'pyrolaser': self._laser_state}
         return {'item': item, 'command': command, 'values': values}
 
-    def change_poll_interval(self, value):
-        """
-        Updates the poll interval to the specified value. Entering 0 returns to the default value
-        """
-        if value > 0:
-            self._poll_interval = value
-        else:
-            self._poll_interval = self._default_poll_interval
-
 pyrometer = PyrometerObject()
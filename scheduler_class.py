@@ -0,0 +1,120 @@
+"""
+Shared deadline scheduler
+
+A single thread runs every timer and periodic job of the application from a heap ordered by deadline on the
+monotonic clock. Timers are registered with call_later (one shot) or call_every (periodic) and return a handle
+that cancels them, so an auto-off timer is cancelled when the laser is switched off manually and can never fire
+into a later session. The thread count stays constant however often timers are started.
+
+Jobs run on the scheduler thread, so they must be short and must not block; work that waits on I/O (e.g. serial
+transactions) keeps its own thread.
+
+Classes:
+    ScheduledCall: Handle of a scheduled job
+    Scheduler: The deadline scheduler
+
+Attributes:
+    scheduler: The application scheduler
+"""
+from heapq import heappush, heappop
+from itertools import count
+from threading import Thread, Condition
+from time import monotonic
+from logmanager import logger
+
+
+class ScheduledCall:
+    """
+    Handle of a scheduled job, returned by the Scheduler. Calling cancel() stops the job from running again, it is
+    safe to call from any thread, including from the job itself, and more than once.
+    """
+    __slots__ = ('deadline', 'interval', 'function', 'args', 'cancelled')
+
+    def __init__(self, deadline, interval, function, args):
+        self.deadline = deadline
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancels the job."""
+        self.cancelled = True
+
+    def remaining(self):
+        """Returns the seconds until the job is next due, or None if it has been cancelled."""
+        if self.cancelled:
+            return None
+        return max(self.deadline - monotonic(), 0)
+
+
+class Scheduler:
+    """
+    Runs scheduled jobs on one thread in deadline order. Periodic jobs are rescheduled from their previous deadline,
+    so they do not drift, and missed runs are skipped rather than run in a burst.
+    """
+    def __init__(self):
+        self._heap = []
+        self._sequence = count()
+        self._condition = Condition()
+        scheduler_thread = Thread(target=self._run, daemon=True)
+        scheduler_thread.name = 'Scheduler thread'
+        scheduler_thread.start()
+
+    def call_at(self, deadline, function, *args, interval=0):
+        """Runs function(*args) at the monotonic clock time deadline, then every interval seconds if interval > 0."""
+        call = ScheduledCall(deadline, interval, function, args)
+        self._push(call)
+        return call
+
+    def call_later(self, delay, function, *args):
+        """Runs function(*args) once after delay seconds."""
+        return self.call_at(monotonic() + delay, function, *args)
+
+    def call_every(self, interval, function, *args, delay=None):
+        """Runs function(*args) every interval seconds, the first run is after delay seconds (default interval)."""
+        return self.call_at(monotonic() + (interval if delay is None else delay), function, *args, interval=interval)
+
+    def _push(self, call):
+        with self._condition:
+            heappush(self._heap, (call.deadline, next(self._sequence), call))
+            self._condition.notify()
+
+    def pending(self):
+        """Returns the number of jobs waiting to run."""
+        with self._condition:
+            return sum(1 for _, _, call in self._heap if not call.cancelled)
+
+    def _next_call(self):
+        """Waits for the next job that is due and has not been cancelled and removes it from the heap."""
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, call = self._heap[0]
+                if call.cancelled:
+                    heappop(self._heap)
+                    continue
+                wait = deadline - monotonic()
+                if wait <= 0:
+                    heappop(self._heap)
+                    return call
+                self._condition.wait(wait)
+
+    def _run(self):
+        while True:
+            call = self._next_call()
+            if call.interval > 0:
+                now = monotonic()
+                call.deadline += call.interval
+                if call.deadline <= now:
+                    call.deadline = now + call.interval
+                self._push(call)
+            try:
+                call.function(*call.args)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('Scheduler: job %s failed', call.function)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,248 @@
+"""
+Asyncio Serial Engine
+
+This module provides an alternative engine for the serial channels that drives every configured
+port from a single asyncio event loop instead of a transaction thread and a listener thread per port.
+Ports are opened non-blocking and their file descriptors are registered with the event loop, so a rig
+with many RS232/RS485 devices only needs one thread for all of its serial traffic.
+
+The engine is selected with settings['serial_engine'] = 'asyncio'. SerialConnection keeps ownership of
+the channel configuration and the listener values; the engine only moves bytes and schedules polls.
+When a port fails the engine hands it back to the SerialConnection reconnect supervisor, which attaches
+the reopened port again.
+
+Each transaction has its own timeout, taken from the compiled message (the optional 'timeout' field in ms),
+otherwise the default port timeout is used.
+
+Classes:
+    AsyncSerialEngine: Event loop that owns all serial ports when the asyncio engine is selected
+
+Functions:
+    reply_complete: Checks whether a buffered reply satisfies the framing of a message
+"""
+import asyncio
+from concurrent.futures import Future
+from functools import partial
+from itertools import count
+from threading import Thread
+from time import time
+import serial  # from pyserial
+from logmanager import logger
+from app_control import settings
+from serial_message_class import PRIORITY_POLL
+
+CONNECT_WAIT = 1  # seconds a disconnected poller waits for the reconnect before checking again
+
+
+def reply_complete(buffer, size, terminator):
+    """
+    Returns the number of bytes of the buffer that form a complete reply, or 0 if the reply is not complete yet.
+    A reply is complete when it contains the terminator or when size bytes have been received.
+    """
+    if terminator:
+        position = buffer.find(terminator, 0, size)
+        if position > -1:
+            return position + len(terminator)
+    if len(buffer) >= size:
+        return size
+    return 0
+
+
+class PortState:
+    """
+    Holds the event loop side state of a single serial channel: the receive buffer, the event that is set
+    whenever new bytes arrive and the priority queue of pending transactions.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = bytearray()
+        self.data_ready = asyncio.Event()
+        self.transactions = asyncio.PriorityQueue()
+        self.reading = False
+        self.tasks = []
+
+
+class AsyncSerialEngine:
+    """
+    Runs an asyncio event loop on a single thread and multiplexes all attached serial channels on it.
+
+    Callers on other threads submit transactions with submit(), which returns a concurrent.futures.Future
+    just like the threaded engine, so SerialConnection.api_command and the pyrometer are unaware of which
+    engine is in use.
+    """
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._ports = {}
+        self._sequence = count()
+        loop_thread = Thread(target=self._loop.run_forever, daemon=True)
+        loop_thread.name = 'Serial asyncio engine'
+        loop_thread.start()
+        logger.info('Serial Async Class: asyncio serial engine started')
+
+    def attach(self, connection):
+        """
+        Registers an opened serial channel with the event loop. The port file descriptor is watched for incoming
+        data, a transaction worker is started and, if the channel has listener messages, a poller is started.
+        """
+        self._loop.call_soon_threadsafe(self._attach, connection)
+
+    def _attach(self, connection):
+        if connection.name() in self._ports:
+            self._detach(self._ports[connection.name()])
+        state = PortState(connection)
+        self._ports[connection.name()] = state
+        self._loop.add_reader(connection.port.fileno(), self._on_readable, state)
+        state.reading = True
+        state.tasks.append(self._loop.create_task(self._transaction_worker(state)))
+        if connection.mode() == 'listener':
+            state.tasks.append(self._loop.create_task(self._streamer(state)))
+        elif len(connection.listener_messages()) > 0:
+            state.tasks.append(self._loop.create_task(self._poller(state)))
+        logger.info('Serial Async Class: %s attached to asyncio engine', connection.name())
+
+    @staticmethod
+    def _detach(state):
+        """Stops the tasks of a channel that is being re-attached after a reconnect and fails its queued transactions."""
+        for task in state.tasks:
+            task.cancel()
+        while not state.transactions.empty():
+            transaction = state.transactions.get_nowait()[4]
+            if transaction.set_running_or_notify_cancel():
+                transaction.set_exception(serial.SerialException('Port %s reconnected' % state.connection.name()))
+
+    def submit(self, connection, message, priority, source):
+        """
+        Queues a message for the channel and returns a Future that resolves to the binary reply. This may be
+        called from any thread.
+        """
+        transaction = Future()
+        self._loop.call_soon_threadsafe(self._enqueue, connection.name(), (priority, next(self._sequence),
+                                                                          message, source, transaction))
+        return transaction
+
+    def _enqueue(self, name, entry):
+        try:
+            self._ports[name].transactions.put_nowait(entry)
+        except KeyError:
+            entry[4].set_exception(serial.SerialException('Port %s is not attached' % name))
+
+    def _on_readable(self, state):
+        """Called by the event loop when the port has data, moves it into the channel receive buffer."""
+        port = state.connection.port
+        try:
+            data = port.read(port.in_waiting or 1)
+            if not data:
+                raise serial.SerialException('device reports readiness to read but returned no data')
+        except (OSError, serial.SerialException) as error:
+            self._port_failed(state, error)
+            return
+        state.buffer.extend(data)
+        state.data_ready.set()
+
+    def _port_failed(self, state, error):
+        """Stops watching a failed port and hands it to the reconnect supervisor of its SerialConnection."""
+        if not state.reading:
+            return
+        self._loop.remove_reader(state.connection.port.fileno())
+        state.reading = False
+        state.data_ready.set()
+        logger.error('Serial Async Class: %s stopped responding, reader removed', state.connection.name())
+        state.connection.connection_lost(error)
+
+    async def _transaction_worker(self, state):
+        """Serves the transactions queued for one channel, highest priority first."""
+        while True:
+            _, _, message, source, transaction = await state.transactions.get()
+            if not transaction.set_running_or_notify_cancel():
+                continue
+            try:
+                transaction.set_result(await self._send_message(state, message, source))
+            except (OSError, serial.SerialException) as error:
+                transaction.set_exception(serial.SerialException(str(error)))
+                self._port_failed(state, error)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                transaction.set_exception(error)
+
+    async def _send_message(self, state, message, source):
+        """Writes string 1 (and string 2) of a message and returns the framed reply to the last string written."""
+        port = state.connection.port
+        if not state.reading:
+            raise serial.SerialException('Port %s is not readable' % state.connection.name())
+        state.buffer.clear()
+        port.write(message.string1)
+        binary_data = await self._read_reply(state, message.reply_size, message.terminator, message.gap, message.timeout)
+        if settings['serial_debug']:
+            logger.info('Serial Async Class: %s string 1 binary data: %s', source, binary_data)
+        if message.string2:
+            port.write(message.string2)
+            binary_data = await self._read_reply(state, message.reply_size, message.terminator, message.gap,
+                                                 message.timeout)
+            if settings['serial_debug']:
+                logger.info('Serial Async Class: %s string 2 binary data: %s', source, binary_data)
+        return binary_data
+
+    async def _read_reply(self, state, size, terminator, gap, timeout):
+        """
+        Waits for a reply to arrive in the receive buffer. Returns when the reply is complete, when the line has
+        been silent for the gap after the first byte, or when the transaction timeout expires.
+        """
+        deadline = self._loop.time() + timeout
+        while True:
+            length = reply_complete(state.buffer, size, terminator)
+            remaining = deadline - self._loop.time()
+            if length == 0 and remaining > 0:
+                state.data_ready.clear()
+                wait = min(gap, remaining) if state.buffer else remaining
+                try:
+                    await asyncio.wait_for(state.data_ready.wait(), wait)
+                    continue
+                except asyncio.TimeoutError:
+                    if not state.buffer:
+                        continue
+            if length == 0:
+                length = min(len(state.buffer), size)
+            reply = bytes(state.buffer[:length])
+            del state.buffer[:length]
+            return reply
+
+    async def _streamer(self, state):
+        """Hands everything received on a listener mode channel to its frame parser as it arrives."""
+        while state.reading:
+            await state.data_ready.wait()
+            state.data_ready.clear()
+            binary_data = bytes(state.buffer)
+            state.buffer.clear()
+            state.connection.stream_data(binary_data, time())
+
+    async def _poller(self, state):
+        """
+        Polls the listener messages of an interactive channel at the channel poll interval. Between polls, and after
+        a failed poll, the poller waits the poll interval or until the poll schedule requests an early poll (e.g. a
+        burst has started or the laser was switched on). While the channel is disconnected the poller waits for the
+        reconnect, that wait runs in the default executor.
+        """
+        connection = state.connection
+        wake = asyncio.Event()
+        connection.poll_waker(partial(self._loop.call_soon_threadsafe, wake.set))
+        while True:
+            while not connection.wait_connected(0):
+                await self._loop.run_in_executor(None, connection.wait_connected, CONNECT_WAIT)
+            try:
+                transactions = [(item, self.submit(connection, item, PRIORITY_POLL, 'Interactive'))
+                                for item in connection.listener_messages()]
+                replies = []
+                for item, transaction in transactions:
+                    replies.append((item, await asyncio.wrap_future(transaction)))
+                connection.interactive_data(replies)
+            except serial.SerialException:
+                logger.exception('Serial Async Class: Listener Read Error on %s', connection.name())
+            await self._wait_poll(wake, connection.poll_interval())
+
+    @staticmethod
+    async def _wait_poll(wake, timeout):
+        """Waits up to timeout seconds for the next poll, returns early when the wake event is set."""
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
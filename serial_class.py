@@ -10,9 +10,22 @@ Key Features:
     - Interactive mode for command-response protocols
     - Listener mode for passive data acquisition with configurable polling
     - Base64 encoding/decoding for message storage and transmission
+    - Response framing by expected length, terminator or inter-byte gap so a
+      transaction returns as soon as the device reply is complete
     - Automatic message parsing and value extraction
-    - Thread-safe operations with built-in retry mechanisms
-    - Dynamic port discovery and configuration management
+    - Typed binary fields (struct format with scale and offset) published as numbers
+    - Message tables compiled once per channel, with api commands and item names resolved by dict lookup
+    - Per-port transaction queue with priorities so API commands preempt queued listener polls
+    - Burst acquisition that polls selected listener messages back to back, as fast as the device replies
+    - Subscriptions that notify consumers as soon as a poll or frame produces new listener values
+    - Adaptive polling that polls fast while values change or an associated output is active and backs off to
+      the configured poll interval when values are stable (see serial_link_class)
+    - Supervised connections that reconnect with exponential backoff (see serial_link_class) and follow a USB
+      adapter by its serial number if its tty name changes
+    - Dynamic port discovery from /sys/class/tty metadata (no device opens), cached between page loads (see
+      serial_discovery_class)
+
+The compiled message definitions and the listener frame parser are in serial_message_class.
 
 Classes:
     SerialConnection: Main class for managing individual serial port connections
@@ -26,13 +39,17 @@ Functions:
         - serial_port_info: Retrieve detailed port configuration
 
     Utility Functions:
-        - str_encode/str_decode: Base64 string encoding/decoding
-        - serial_ports: Auto-discover available serial ports
         - serial_http_data: Aggregate data from all configured channels
 
 Communication Modes:
     Interactive: Send commands and read responses with configurable timing
-    Listener: Continuously monitor incoming data and extract specific values
+    Listener: Continuously monitor incoming data and extract specific values, a streaming
+              frame parser keeps partial frames across reads and emits every complete frame
+
+Engines:
+    threaded: each channel has its own transaction and listener threads (default)
+    asyncio: all channels are driven from a single event loop (see serial_async_class),
+             selected with settings['serial_engine'] = 'asyncio'
 
 Usage:
     The module automatically initializes all configured serial channels on import.
@@ -40,37 +57,25 @@ Usage:
     accessed via the serial_http_data() function or individual channel instances.
 """
 from ast import literal_eval
-from time import sleep
+from time import sleep, time, monotonic
+from collections import deque
 from threading import Thread
-from base64 import b64decode, b64encode
+from queue import PriorityQueue
+from itertools import count
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from datetime import datetime
-import glob
-import sys
 import serial  # from pyserial
 from logmanager import logger
-from app_control import settings, writesettings, friendlyname, jscriptname
-
-
-def str_encode(string):
-    """
-    Encodes a given string to its Base64 representation.
-
-    This function takes a string and encodes it using Base64. The encoding
-    is performed by first converting the string to its byte representation
-    in UTF-8, then applying Base64 encoding to it, and finally decoding
-    the resulting bytes back into a string.
-    """
-    return b64encode(string).decode('utf-8')
-
-
-def str_decode(string):
-    """
-    Decodes a Base64 encoded string into a UTF-8 string.
-
-    This function takes a string that is Base64 encoded, decodes it from
-    Base64, and then decodes the resulting bytes into a UTF-8 string.
-    """
-    return b64decode(string)
+from app_control import settings, writesettings, friendlyname, jscriptname, register_reload
+from serial_link_class import ReconnectSupervisor, PollSchedule, FAST_POLL_INTERVAL
+from serial_message_class import (str_encode, str_decode, decode_reply, compile_message, field_format, FrameParser,
+                                  DEFAULT_REPLY_GAP, PORT_TIMEOUT, PRIORITY_API, PRIORITY_POLL)
+from serial_discovery_class import serial_port_details, serial_port_device
+if settings['serial_engine'] == 'asyncio':
+    from serial_async_class import AsyncSerialEngine
+REPLY_POLL = 0.002  # seconds between checks of the input buffer while a reply is being framed
+TRANSACTION_TIMEOUT = 10  # seconds a caller waits for a queued transaction before giving up
+FRAME_HISTORY = 1000  # number of listener frames kept per channel for consumers
 
 
 def update_serial_channel(serial_config):
@@ -86,7 +91,11 @@ def update_serial_channel(serial_config):
     serial_channel_list = []
     serial_channel= {'api-name': friendlyname(serial_config['api-name']), 'port': serial_config['port'],
                      'mode': serial_config['mode'], 'baud': int(serial_config['baud']),
-                     'poll_interval': int(serial_config['poll_interval']), 'messages': []}
+                     'poll_interval': float(serial_config['poll_interval']),
+                     'polling': serial_config.get('polling', 'fixed'),
+                     'fast_poll_interval': float(serial_config.get('fast_poll_interval', FAST_POLL_INTERVAL)),
+                     'change_threshold': float(serial_config.get('change_threshold', 0)),
+                     'messages': [], 'usb-serial': ''}
     if len(settings['serial_channels']) == 0:
         settings['serial_channels'] = [serial_channel]
         writesettings()
@@ -94,6 +103,7 @@ def update_serial_channel(serial_config):
     for conn in settings['serial_channels']:
         if conn['port'] == serial_config['port']:
             serial_channel['messages'] = conn['messages']
+            serial_channel['usb-serial'] = conn.get('usb-serial', '')
         else:
             serial_channel_list.append(conn)
     serial_channel_list.append(serial_channel)
@@ -124,6 +134,19 @@ def delete_serial_channel(port_id):
     return serial_channel_list
 
 
+def bytes_value(string):
+    """
+    Converts a message string entered on the serial config page into bytes. Strings may be entered as a
+    python bytes literal (b'\\x01') or as plain text, an empty string returns empty bytes.
+    """
+    if not string:
+        return b''
+    try:
+        return literal_eval(string)
+    except (ValueError, SyntaxError):
+        return literal_eval("b'%s'" % string)
+
+
 def update_serial_message(serial_message):
     """
     Update and manage the serial message structure and settings.
@@ -133,18 +156,17 @@ def update_serial_message(serial_message):
     port, and writes the updated settings. It logs actions performed and
     manages the organization of messages for a serial channel.
     """
-    print(serial_message['string1'], serial_message['string2'])
-    try:
-        string1 = literal_eval(serial_message['string1'])
-    except (ValueError, SyntaxError):
-        string1 = literal_eval("b'%s'" % serial_message['string1'])
-    try:
-        string2 = literal_eval(serial_message['string2'])
-    except (ValueError, SyntaxError):
-        string2 = literal_eval("b'%s'" % serial_message['string2'])
+    string1 = bytes_value(serial_message['string1'])
+    string2 = bytes_value(serial_message['string2'])
+    terminator = bytes_value(serial_message.get('terminator', ''))
     message_list = [{'name': serial_message['name'], 'string1': str_encode(string1),
                     'string2': str_encode(string2), 'start': int(serial_message['start']),
-                    'length': int(serial_message['length']), 'api-command': friendlyname(serial_message['api-command'])}]
+                    'length': int(serial_message['length']), 'api-command': friendlyname(serial_message['api-command']),
+                    'reply-length': int(serial_message.get('reply-length', 0) or 0), 'terminator': str_encode(terminator),
+                    'gap': int(serial_message.get('gap', DEFAULT_REPLY_GAP) or DEFAULT_REPLY_GAP),
+                    'timeout': int(serial_message.get('timeout', PORT_TIMEOUT * 1000) or PORT_TIMEOUT * 1000),
+                    'format': field_format(serial_message.get('format', '')),
+                    'scale': float(serial_message.get('scale', 1) or 1), 'offset': float(serial_message.get('offset', 0) or 0)}]
     for conn in settings['serial_channels']:
         if conn['port'] == serial_message['port']:
             for message in conn['messages']:
@@ -188,51 +210,32 @@ def serial_port_info(port_id):
     configuration for the port is retrieved; otherwise, default settings are used.
     """
     serial_details = {'api-name': friendlyname(port_id), 'port': port_id, 'mode': 'interactive',
-                      'baud': 9600, 'poll_interval': 10, 'messages':[], 'configured': False}
+                      'baud': 9600, 'poll_interval': 10, 'polling': 'fixed', 'fast_poll_interval': FAST_POLL_INTERVAL,
+                      'change_threshold': 0, 'messages':[], 'configured': False}
     for conn in settings['serial_channels']:
         if conn['port'] == port_id:
             serial_details['mode'] = conn['mode']
             serial_details['baud'] = conn['baud']
             serial_details['api-name'] = conn['api-name']
             serial_details['poll_interval'] = conn['poll_interval']
+            serial_details['polling'] = conn.get('polling', 'fixed')
+            serial_details['fast_poll_interval'] = conn.get('fast_poll_interval', FAST_POLL_INTERVAL)
+            serial_details['change_threshold'] = conn.get('change_threshold', 0)
             messages=[]
             for message in conn['messages']:
                 messages.append({'api-command': message['api-command'], 'name': message['name'], 'string1': str_decode(message['string1']),
                                  'string2': str_decode(message['string2']), 'start': message['start'],
-                                 'length': message['length']})
+                                 'length': message['length'], 'reply-length': message.get('reply-length', 0),
+                                 'terminator': str_decode(message.get('terminator', '')),
+                                 'gap': message.get('gap', DEFAULT_REPLY_GAP),
+                                 'timeout': message.get('timeout', PORT_TIMEOUT * 1000), 'format': message.get('format', ''),
+                                 'scale': message.get('scale', 1), 'offset': message.get('offset', 0)})
             serial_details['configured'] = True
             serial_details['messages'] = messages
+    serial_details['device'] = serial_port_device(port_id)
     return serial_details
 
 
-def serial_ports():
-    """ Lists serial port names available on the system
-
-        :raises EnvironmentError:
-            On unsupported or unknown platforms
-        :returns:
-            A list of the serial ports available on the system
-    """
-    if sys.platform.startswith('win'):
-        detected_ports = ['COM%s' % (i + 1) for i in range(8)]
-        return detected_ports # # work around for testing on windows
-    if sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-        # this excludes your current terminal "/dev/tty"
-        detected_ports = glob.glob('/dev/tty[A-Za-z]*')
-    elif sys.platform.startswith('darwin'):
-        detected_ports = glob.glob('/dev/tty.*')
-    else:
-        raise EnvironmentError('Unsupported platform')
-
-    result = []
-    for serial_port in detected_ports:
-        try:
-            s = serial.Serial(serial_port)
-            s.close()
-            result.append(serial_port)
-        except (OSError, serial.SerialException):
-            pass
-    return result
 
 
 class SerialConnection:
@@ -244,59 +247,197 @@ class SerialConnection:
     Designed for applications requiring consistent serial port communication, with support
     for interactive and non-interactive (listener) modes. The class allows users to automate
     polling of devices and processing of incoming data based on predefined configurations.
+
+    In interactive mode a single transaction thread owns the port. Callers submit messages to a
+    priority queue and receive a Future with the reply, so API commands overtake queued listener
+    polls and bytes from two transactions can never interleave on the wire.
+
+    The connection is supervised by a ReconnectSupervisor: a port that is missing at start up or fails later is
+    retried with exponential backoff, and a USB adapter is found again by its serial number if it comes back under a
+    different tty name.
+
+    The interval between listener polls of an interactive channel is kept by a PollSchedule, fixed or adaptive. In
+    burst mode (see set_burst) the selected messages are polled back to back with no interval at all, API commands
+    still take priority over the burst polls.
     """
     def __init__(self, device):
-        self._port_ready = False
         self._baud_rate = device['baud']
         self._port = device['port']
+        self._device_path = device['port']
+        self._usb_serial = device.get('usb-serial', '')
         self.port = None
+        self._link = ReconnectSupervisor(self._port, self._open_port)
         self._mode = device['mode']
-        self._active = False
+        self._transactions = PriorityQueue()
+        self._sequence = count()
         self._name = device['api-name']
         if self._mode == 'interactive':
             self._read_buffer = 256
         else:
             self._read_buffer = 1024
-        self._default_poll_interval = device['poll_interval']
-        self._poll_interval =  self._default_poll_interval
-        self._listener_messages = []
-        self._api_messages = []
+        self._polls = PollSchedule(device)
+        self._subscribers = []
+        self._burst_messages = ()
+        self._listener_messages = ()
+        self._api_messages = {}
         self._listener_values = []
-        for message in device['messages']:
-            if message['api-command'] == '':
-                self._listener_messages.append({'name': message['name'], 'string1': message['string1'],
-                                                'string2': message['string2'], 'start': message['start'],
-                                                'length': message['length']})
-                self._listener_values.append({'name': message['name'], 'port': self._port, 'value': '0',
-                                              'portstatus': '%s Not Ready' % self._port, "read_time": "01-01-1979 00:00:00"})
+        self._load_messages(device['messages'])
+        self._frames = deque(maxlen=FRAME_HISTORY)
+        self._init_port()
+
+    def _load_messages(self, messages):
+        """
+        Compiles the listener and api messages of the channel. Listener values of messages that are kept keep their
+        latest value. The message tables are replaced as a whole, so threads reading them never see a partial update.
+        """
+        listener_messages = []
+        api_messages = {}
+        previous = {listener_value['name']: listener_value for listener_value in self._listener_values}
+        listener_values = []
+        for message in messages:
+            compiled = compile_message(message, self._read_buffer)
+            if compiled.api_command == '':
+                listener_messages.append(compiled)
+                listener_values.append(previous.get(message['name'],
+                                                    {'name': message['name'], 'port': self._port, 'value': '0',
+                                                     'portstatus': '%s Not Ready' % self._port,
+                                                     "read_time": "01-01-1979 00:00:00"}))
                 logger.info('Serial Class: %s, listener message registered: %s', self._port, message['name'])
             else:
-                self._api_messages.append({'name': message['name'], 'string1': message['string1'],
-                                           'string2': message['string2'], 'start': message['start'],
-                                           'length': message['length'], 'api-command': message['api-command']})
+                api_messages[compiled.api_command] = compiled
                 logger.info('Serial Class: %s, api message registered: %s', self._port, message['api-command'])
-        self.init_port()
+        self._frame_parser = FrameParser(tuple(listener_messages))
+        self._listener_values = listener_values
+        self._api_messages = api_messages
+        self._listener_messages = tuple(listener_messages)
 
-    def init_port(self):
+    def reload(self, device):
         """
-        Initialize the serial port with specified parameters. This method attempts to
-        establish a connection to the serial port using the given port and baud rate.
-        Upon successful initialization, the input buffer is reset and the port is
-        marked as ready. If the connection fails, the port is marked as not ready.
+        Applies changed channel settings in-process: the baud rate, the polling settings and the messages. Returns
+        True if the port, mode or api name changed, or listener messages were added to a channel that had none and
+        so has no poller, which need a restart.
         """
-        try:
-            self.port = serial.Serial(self._port, self._baud_rate, timeout=1)
-            self.port.reset_input_buffer()
-            self._port_ready = True
-            print('Serial Class: %s connected' % self._port)
-            logger.info('Serial Class: %s connected', self._port)
-            if len(self._listener_messages) > 0:
-                reader_thread = Thread(target=self.listener_timer, daemon=True)
+        if (device['port'], device['mode'], device['api-name']) != (self._port, self._mode, self._name):
+            logger.warning('Serial Class: %s port, mode or name changed, a restart is needed', self._port)
+            return True
+        polled = len(self._listener_messages) > 0 or self._mode == 'listener'
+        if device['baud'] != self._baud_rate:
+            self._baud_rate = device['baud']
+            if self.port is not None:
+                try:
+                    self.port.baudrate = self._baud_rate
+                except (serial.SerialException, ValueError):
+                    logger.exception('Serial Class: %s baud rate could not be changed', self._port)
+        self._polls.configure(device)
+        self._load_messages(device['messages'])
+        if self._polls.bursting():
+            self._burst_messages = tuple(message for message in self._listener_messages
+                                         if message.name in {item.name for item in self._burst_messages})
+        self._polls.adapt(True)
+        self._polls.wake()
+        logger.info('Serial Class: %s settings reloaded', self._port)
+        return not polled and len(self._listener_messages) > 0
+
+    def _init_port(self):
+        """
+        Starts the channel threads and makes the first connection attempt. If the port cannot be opened the
+        channel is left to the reconnect supervisor, so a device plugged in after start up is picked up without
+        a restart. The threads wait while the port is not connected.
+        """
+        if not SERIAL_ENGINE:
+            if self._mode == 'interactive':
+                transaction_thread = Thread(target=self._transaction_worker, daemon=True)
+                transaction_thread.name = 'Serial transactions %s' % self._name
+                transaction_thread.start()
+            if self._mode == 'listener':
+                reader_thread = Thread(target=self._stream_reader, daemon=True)
+                reader_thread.name = 'Serial stream reader %s' % self._name
+                reader_thread.start()
+            elif len(self._listener_messages) > 0:
+                reader_thread = Thread(target=self._listener_timer, daemon=True)
                 reader_thread.name = 'Serial listener %s' % self._name
                 reader_thread.start()
-        except serial.SerialException:
-            self._port_ready = False
-            logger.error('Serial Class: %s not connected', self._port)
+        if not self._open_port():
+            self._link.start()
+
+    def _open_port(self):
+        """
+        Opens the serial port with the channel settings, on the tty found by _bound_device. Returns True when the
+        port is connected.
+        """
+        device_path = self._bound_device()
+        try:
+            if SERIAL_ENGINE:
+                self.port = serial.Serial(device_path, self._baud_rate, timeout=0)
+            else:
+                self.port = serial.Serial(device_path, self._baud_rate, timeout=PORT_TIMEOUT)
+            self.port.reset_input_buffer()
+        except (serial.SerialException, OSError) as error:
+            self._link.failed(error)
+            logger.error('Serial Class: %s not connected', device_path)
+            return False
+        self._device_path = device_path
+        self._remember_usb_serial()
+        self._link.connected()
+        print('Serial Class: %s connected' % device_path)
+        logger.info('Serial Class: %s connected', device_path)
+        if SERIAL_ENGINE:
+            SERIAL_ENGINE.attach(self)
+        return True
+
+    def _bound_device(self):
+        """
+        Returns the tty to open. A channel with a known USB serial number checks the adapter on the configured tty
+        first: if the tty is missing or now belongs to another adapter (two adapters can swap names, e.g. after a
+        reboot) the channel is rebound to whichever tty has its serial number. If no tty has it the configured tty
+        is used.
+        """
+        if not self._usb_serial:
+            return self._port
+        usb_serials = {port_info['port']: port_info['serial_number']
+                       for port_info in serial_port_details(refresh=True)}
+        if usb_serials.get(self._port) == self._usb_serial:
+            return self._port
+        for device_path, usb_serial in usb_serials.items():
+            if usb_serial == self._usb_serial:
+                logger.warning('Serial Class: %s is not usb serial number %s, rebinding to %s', self._port,
+                               self._usb_serial, device_path)
+                return device_path
+        return self._port
+
+    def _remember_usb_serial(self):
+        """
+        Records the USB serial number of the connected adapter in the channel settings so the channel can find
+        the adapter again if the tty name changes, including after a restart.
+        """
+        usb_serial = serial_port_device(self._device_path)['serial_number']
+        if usb_serial and usb_serial != self._usb_serial:
+            self._usb_serial = usb_serial
+            for conn in settings['serial_channels']:
+                if conn['port'] == self._port:
+                    conn['usb-serial'] = usb_serial
+                    writesettings()
+            logger.info('Serial Class: %s usb serial number %s recorded', self._port, usb_serial)
+
+    def connection_lost(self, error):
+        """
+        Called when a read or write fails. The port is closed and the reconnect supervisor is started, further
+        calls while the channel is already reconnecting are ignored.
+        """
+        if not self._link.lost(error):
+            return
+        logger.error('Serial Class: %s connection lost: %s', self._device_path, error)
+        try:
+            self.port.close()
+        except (serial.SerialException, OSError):
+            pass
+        self._link.start()
+
+    def health(self):
+        """
+        Returns the connection health of the channel for the status page and api.
+        """
+        return {**self._link.health(), 'port': self._port, 'device': self._device_path, 'usb-serial': self._usb_serial}
 
     def name(self):
         """
@@ -304,85 +445,249 @@ class SerialConnection:
         """
         return self._name
 
-    def listener_timer(self):
+    def mode(self):
+        """
+        Retrieves the mode of the channel, 'interactive' or 'listener'.
+        """
+        return self._mode
+
+    def port_name(self):
+        """
+        Retrieves the configured port of the channel.
+        """
+        return self._port
+
+    def poll_interval(self):
+        """
+        Retrieves the current poll interval in seconds.
+        """
+        return self._polls.interval()
+
+    def wait_connected(self, timeout=None):
+        """
+        Waits up to timeout seconds for the channel to be connected, returns True if it is.
+        """
+        return self._link.wait(timeout)
+
+    def poll_waker(self, callback):
+        """
+        Registers a callback that is called whenever an early poll is requested (e.g. a burst has started), used by
+        pollers that do not wait on the poll schedule itself.
+        """
+        self._polls.set_waker(callback)
+
+    def listener_messages(self):
+        """
+        Retrieves the messages that are polled by the listener, only the burst messages while a burst is running.
         """
-        Reads data from a serial port in a loop with a specified polling interval. The behavior
-        differs based on the mode of operation ('listener' or otherwise). If in 'listener' mode,
-        it processes incoming data to extract specific substrings based on predefined message definitions.
+        if self._polls.bursting():
+            return self._burst_messages
+        return self._listener_messages
+
+    def _listener_timer(self):
+        """
+        Polls the listener messages of an interactive channel in a loop with a specified polling interval.
         """
         while True:
             try:
-                retry_count = 0
-                while self._active:
-                    sleep(0.1)
-                    retry_count += 1
-                    if retry_count > 10:
-                        logger.warning('Serial Class: Listener waiting for more than 1s for port %s to become free on', self._port)
-                        break
-                self._active = True
-                listener_values = []
-                self.port.reset_input_buffer()
-                if self._mode == 'interactive':
-                    for item in self._listener_messages:
-                        self.port.write(b64decode(item['string1']))
-                        sleep(0.5)
-                        binary_data = self.port.read(size=self._read_buffer)
-                        if settings['serial_debug']:
-                            logger.info('Serial Class: Interactive string 1 binary data: %s', binary_data)
-                        try:
-                            string_data = str(binary_data, 'utf-8')
-                        except UnicodeDecodeError:
-                            string_data = str(binary_data, 'iso-8859-1')
-                        if item['string2']:
-                            self.port.write(b64decode(item['string2']))
-                            sleep(0.5)
-                            binary_data = self.port.read(size=self._read_buffer)
-                            if settings['serial_debug']:
-                                logger.info('Serial Class: Interactive string 2 binary data: %s', binary_data)
-                                try:
-                                    string_data = str(binary_data, 'utf-8')
-                                except UnicodeDecodeError:
-                                    string_data = str(binary_data, 'iso-8859-1')
-                        listener_values.append({'name': item['name'], 'port': self._port,
-                                                'value': string_data[item['start']:item['length']],
-                                                'portstatus': '%s (%s)' %(self._name, self._port),
-                                                "read_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-                else:
-                    binary_data = self.port.read(size=self._read_buffer)
-                    if settings['serial_debug']:
-                        logger.info('Serial Class: Listener binary data: %s', binary_data)
-                    try:
-                        string_data = str(binary_data, 'utf-8')
-                    except UnicodeDecodeError:
-                        string_data = str(binary_data, 'iso-8859-1')
-                    for item in self._listener_messages:
-                        name = item['name']
-                        findstring = str_decode(item['string1']).decode('utf-8')
-                        length = item['length']
-                        position = string_data.find(findstring)
-                        if position > -1:
-                            listener_values.append({'name': name,  'port': self._port,
-                                          'value': string_data[position + len(findstring):position + len(findstring) + length - 1],
-                                                'portstatus': '%s (%s)' %(self._name, self._port),
-                                                "read_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-                        else:
-                            listener_values.append({'name': name, 'port': self._port,
-                                                    'value': '', 'portstatus': '%s (%s)' %(self._name, self._port),
-                                                    "read_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-                logger.debug('Serial Class: Serial Return "%s" from %s', self._listener_values, self._port)
-                self._active = False
-                if len(listener_values) > 0:
-                    logger.debug('Serial Class: Listener Return "%s" from %s', listener_values, self._port)
-                    self._listener_values = listener_values
+                self._link.wait()
+                transactions = [(item, self.submit(item, PRIORITY_POLL, 'Interactive'))
+                                for item in self.listener_messages()]
+                self.interactive_data([(item, transaction.result(timeout=TRANSACTION_TIMEOUT))
+                                       for item, transaction in transactions])
             except serial.SerialException :
-                self._active = False
                 logger.exception('Serial Class: Listener Read Error on %s: %s', self._port, Exception)
-            sleep_counter = 0
-            while sleep_counter < self._poll_interval:
-                sleep_counter += 1
-                sleep(1)
+            except FutureTimeout:
+                logger.warning('Serial Class: Listener transaction timed out on %s', self._port)
+            self._polls.wait()
+
+    def interactive_data(self, replies):
+        """
+        Builds the listener values from the replies to an interactive poll. Replies is a list of (message, binary
+        reply) pairs, values of messages that were not polled (e.g. during a burst) keep their previous value.
+        """
+        read_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        new_values = {}
+        for item, binary_data in replies:
+            new_values[item.name] = {'name': item.name, 'port': self._port,
+                                     'value': item.value(binary_data, item.start),
+                                     'portstatus': '%s (%s)' %(self._name, self._port), "read_time": read_time}
+        listener_values = [new_values.get(listener_value['name'], listener_value)
+                           for listener_value in self._listener_values]
+        changed = self._polls.changed(self._listener_values, listener_values)
+        self._publish_values(listener_values)
+        self._polls.adapt(changed)
+
+    def set_active(self, active):
+        """
+        Tells an adaptive channel whether an associated output (e.g. the laser) is active, see PollSchedule.
+        """
+        self._polls.set_active(active)
+
+    def set_burst(self, active, names=()):
+        """
+        Starts or stops burst acquisition. While a burst is running the listener messages named (all of them if no
+        names are given) are polled back to back, so readings arrive as fast as the device and baud rate allow.
+        """
+        if active:
+            self._burst_messages = tuple(message for message in self._listener_messages
+                                         if not names or message.name in names) or self._listener_messages
+            logger.info('Serial Class: %s burst acquisition started', self._port)
+        elif self._polls.bursting():
+            logger.info('Serial Class: %s burst acquisition stopped', self._port)
+        self._polls.set_burst(active)
+
+    def _stream_reader(self):
+        """
+        Reads a listener mode port continuously, passing whatever has arrived to the frame parser. The read returns
+        as soon as any data is available so frames are processed as they arrive and nothing is discarded between
+        reads.
+        """
+        while True:
+            self._link.wait()
+            try:
+                self.stream_data(self.port.read(self.port.in_waiting or 1), time())
+            except (serial.SerialException, OSError) as error:
+                self.connection_lost(error)
+
+    def stream_data(self, binary_data, timestamp):
+        """
+        Passes data read in listener mode to the frame parser. Every complete frame is added to the frame history
+        and the listener value for its message is updated to the latest frame.
+        """
+        if not binary_data:
+            return
+        if settings['serial_debug']:
+            logger.info('Serial Class: Listener binary data: %s', binary_data)
+        frames = self._frame_parser.feed(binary_data, timestamp)
+        if len(frames) == 0:
+            return
+        latest = {}
+        for message, binary_value, frame_time in frames:
+            if message.field is None:
+                value = decode_reply(binary_value)
+            else:
+                value = message.value(binary_value, 0)
+            self._frames.append({'name': message.name, 'value': value, 'time': frame_time})
+            latest[message.name] = (value, frame_time)
+        listener_values = []
+        for listener_value in self._listener_values:
+            if listener_value['name'] in latest:
+                value, frame_time = latest[listener_value['name']]
+                listener_value = {'name': listener_value['name'], 'port': self._port, 'value': value,
+                                  'portstatus': '%s (%s)' %(self._name, self._port),
+                                  "read_time": datetime.fromtimestamp(frame_time).strftime("%Y-%m-%d %H:%M:%S")}
+            listener_values.append(listener_value)
+        self._publish_values(listener_values)
+
+    def listener_frames(self, since=0):
+        """
+        Returns the listener mode frames received after the given timestamp, oldest first. Each frame is a dict with
+        the message name, the decoded value and the time it was received.
+        """
+        return [frame for frame in list(self._frames) if frame['time'] > since]
 
-    def api_command(self, item, command):
+    def _publish_values(self, listener_values):
+        """
+        Replaces the current listener values with the values from the latest poll and notifies the subscribers.
+        """
+        logger.debug('Serial Class: Serial Return "%s" from %s', self._listener_values, self._port)
+        if len(listener_values) > 0:
+            logger.debug('Serial Class: Listener Return "%s" from %s', listener_values, self._port)
+            self._listener_values = listener_values
+            for callback in self._subscribers:
+                try:
+                    callback(listener_values)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logger.exception('Serial Class: subscriber %s failed on %s', callback, self._port)
+
+    def subscribe(self, callback):
+        """
+        Registers a callback that is called with the new listener values every time a poll or frame completes. The
+        callback runs on the thread that read the port, so it must return quickly and must not submit transactions
+        and wait for them.
+        """
+        self._subscribers.append(callback)
+
+    def submit(self, message, priority, source):
+        """
+        Queues a message for the transaction thread and returns a Future that resolves to the binary reply. Lower
+        priority numbers are served first, messages with equal priority are served in the order submitted.
+        """
+        if SERIAL_ENGINE:
+            return SERIAL_ENGINE.submit(self, message, priority, source)
+        transaction = Future()
+        self._transactions.put((priority, next(self._sequence), message, source, transaction))
+        return transaction
+
+    def _transaction_worker(self):
+        """
+        Owns the serial port in interactive mode. Takes the highest priority transaction from the queue, runs it
+        to completion and hands the reply (or the error) back to the caller through its Future.
+        """
+        while True:
+            _, _, message, source, transaction = self._transactions.get()
+            if not transaction.set_running_or_notify_cancel():
+                continue
+            if not self._link.is_connected():
+                transaction.set_exception(serial.SerialException('%s not connected' % self._port))
+                continue
+            try:
+                transaction.set_result(self._send_message(message, source))
+            except (serial.SerialException, OSError) as error:
+                transaction.set_exception(serial.SerialException(str(error)))
+                self.connection_lost(error)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                transaction.set_exception(error)
+
+    def _send_message(self, message, source):
+        """
+        Writes string 1 (and string 2 if the message has one) to the serial port and returns the binary reply to
+        the last string written. Each write is followed by a framed read so the transaction completes as soon as
+        the device has finished replying rather than after a fixed delay.
+        """
+        self.port.reset_input_buffer()
+        self.port.write(message.string1)
+        binary_data = self._read_reply(message)
+        if settings['serial_debug']:
+            logger.info('Serial Class: %s string 1 binary data: %s', source, binary_data)
+        if message.string2:
+            self.port.write(message.string2)
+            binary_data = self._read_reply(message)
+            if settings['serial_debug']:
+                logger.info('Serial Class: %s string 2 binary data: %s', source, binary_data)
+        return binary_data
+
+    def _read_reply(self, message):
+        """
+        Reads a reply from the serial port using the response framing configured on the message. The read ends
+        when the terminator is received, when reply-length bytes have arrived, or when the line has been silent for
+        the inter-byte gap after the first byte. The gap is timed here rather than with the port's inter_byte_timeout,
+        which blocks until the full port timeout on POSIX. The message timeout limits a reply that never starts.
+        """
+        reply = bytearray()
+        deadline = monotonic() + message.timeout
+        last_byte = None
+        while len(reply) < message.reply_size:
+            waiting = self.port.in_waiting
+            now = monotonic()
+            if waiting:
+                reply += self.port.read(min(waiting, message.reply_size - len(reply)))
+                last_byte = now
+                if message.terminator:
+                    end = reply.find(message.terminator)
+                    if end >= 0:
+                        return bytes(reply[:end + len(message.terminator)])
+                continue
+            if last_byte is None:
+                if now >= deadline:
+                    break
+            elif now - last_byte >= message.gap:
+                break
+            sleep(REPLY_POLL)
+        return bytes(reply)
+
+    def api_command(self, item, command, wait=True):
         """
         Executes a specified API command by sending encoded data via a serial port and reads back the
         response. The method will match the provided command with predefined messages, decode the
@@ -390,29 +695,35 @@ class SerialConnection:
         the operation.
 
         The method handles errors related to the serial port and returns a descriptive error message if
-        a SerialException occurs or if the serial port is not ready.
+        a SerialException occurs or if the serial port is not ready. The command is queued ahead of
+        any pending listener polls. With wait False the command is only queued and the result returns at once with
+        empty values, for callers such as scheduler jobs that must not block; a failure is then only logged.
         """
         try:
-            for message_item in self._api_messages:
-                if message_item['api-command'] == command:
-                    self.port.write(b64decode(message_item['string1']))
-                    sleep(0.5)
-                    binary_data = self.port.read(size=self._read_buffer)
-                    if settings['serial_debug']:
-                        logger.info('Serial Class: api string 1 binary data: %s', binary_data)
-                    string_data = str(binary_data, 'utf-8')
-                    if message_item['string2']:
-                        self.port.write(b64decode(message_item['string2']))
-                        sleep(0.5)
-                        binary_data = self.port.read(size=self._read_buffer)
-                        if settings['serial_debug']:
-                            logger.info('Serial Class: api string 1 binary data: %s', binary_data)
-                        string_data = str(binary_data, 'utf-8')
-                    return {'item': item,'command': command, 'values': string_data}
-            return {'item': item, 'command': command, 'values': '', 'exception': 'Command not found'}
+            message_item = self._api_messages.get(command)
+            if message_item is None:
+                return {'item': item, 'command': command, 'values': '', 'exception': 'Command not found'}
+            if not self._link.is_connected():
+                return {'item': item, 'command': command, 'values': '', 'exception': 'Serial Port Error or not ready'}
+            transaction = self.submit(message_item, PRIORITY_API, 'api')
+            if not wait:
+                transaction.add_done_callback(self._queued_command_done)
+                return {'item': item, 'command': command, 'values': ''}
+            string_data = decode_reply(transaction.result(timeout=TRANSACTION_TIMEOUT))
+            return {'item': item,'command': command, 'values': string_data}
         except serial.SerialException :
             logger.exception('Serial Class: API Command Error on %s: %s', self._port, Exception)
             return {'item': item, 'command': command, 'values': '', 'exception': 'Serial Port Error or not ready'}
+        except FutureTimeout:
+            logger.warning('Serial Class: API Command timed out on %s', self._port)
+            return {'item': item, 'command': command, 'values': '', 'exception': 'Serial Port timeout'}
+
+    def _queued_command_done(self, transaction):
+        """
+        Logs the failure of an api command that was queued without waiting for its reply.
+        """
+        if transaction.exception() is not None:
+            logger.error('Serial Class: queued API Command failed on %s: %s', self._port, transaction.exception())
 
     def listener_values(self):
         """
@@ -425,12 +736,11 @@ class SerialConnection:
 
     def change_poll_interval(self, value):
         """
-        Updates the poll interval to the specified value. Entering 0 returns to the default value
+        Fixes the poll interval to the specified value, overriding adaptive polling. Entering 0 returns to the
+        default behaviour of the channel.
         """
-        if value > 0:
-            self._poll_interval = value
-        else:
-            self._poll_interval = self._default_poll_interval
+        self._polls.override(value)
+
 
 
 def serial_http_data(item, command):
@@ -445,6 +755,11 @@ def serial_http_data(item, command):
     for channel in serial_channels.values():
         for message in channel.listener_values():
             serial_data['%s%s' %(jscriptname(message['port']), jscriptname(message['name']))] = message
+        health = channel.health()
+        serial_data['%shealth' % jscriptname(health['port'])] = {'name': 'Port health', 'port': health['port'],
+                                                                'value': health['state'], 'health': health,
+                                                                'portstatus': '%s (%s)' % (channel.name(),
+                                                                                          health['device'])}
     return {'item': item, 'command': command, 'values': serial_data}
 
 
@@ -453,18 +768,96 @@ def serial_api_parser(item, command):
     Parses a serial API command and matches it to a corresponding serial channel.
     Executes the parsed command or retrieves a channel-specific listener status.
     """
+    channel = serial_route(item)
+    if channel is None:
+        return {'item': item, 'command': command, 'values': '', 'exception': 'Command not found'}
+    if item == channel.name() + 'status':
+        return {'item': item, 'command': command, 'values': channel.listener_values()}
+    return channel.api_command(item, command)
+
+
+def serial_route(item):
+    """
+    Returns the serial channel that handles an api item, or None. The channel name and the channel status item are
+    found with a single dict lookup, other items that start with a channel name fall back to a prefix search.
+    """
+    channel = serial_routes.get(item)
+    if channel is not None:
+        return channel
     for channel in serial_channels.values():
         if item[:len(channel.name())] == channel.name():
-            if item == channel.name() + 'status':
-                return {'item': item, 'command': command, 'values': channel.listener_values()}
-            return channel.api_command(item, command)
-    return {'item': item, 'command': command, 'values': '', 'exception': 'Command not found'}
+            return channel
+    return None
+
+
+def build_serial_routes():
+    """
+    Builds the item name to channel lookup table used by the api parser.
+    """
+    routes = {}
+    for channel in serial_channels.values():
+        routes[channel.name()] = channel
+        routes[channel.name() + 'status'] = channel
+    return routes
+
+
+def migrate_serial_messages():
+    """
+    Adds the reply framing and field keys to serial messages saved before they existed. The settings loader only
+    merges top level keys, so messages from older installs are filled in here and the settings saved once.
+    """
+    defaults = {'reply-length': 0, 'terminator': '', 'gap': DEFAULT_REPLY_GAP, 'timeout': PORT_TIMEOUT * 1000,
+                'format': '', 'scale': 1, 'offset': 0}
+    migrated = False
+    for conn in settings['serial_channels']:
+        for message in conn['messages']:
+            for key, value in defaults.items():
+                if key not in message:
+                    message[key] = value
+                    migrated = True
+    if migrated:
+        logger.info('Serial Class: added reply framing defaults to saved serial messages')
+        writesettings()
 
 
 # setup the serial channels
+migrate_serial_messages()
+if settings['serial_engine'] == 'asyncio':
+    SERIAL_ENGINE = AsyncSerialEngine()
+else:
+    SERIAL_ENGINE = None
 serial_channels = {}
 for port in settings['serial_channels']:
     serial_channels[port['api-name']] = SerialConnection(port)
+serial_routes = build_serial_routes()
+
+
+def reload_serial():
+    """
+    Applies the serial channel settings in-process, registered as a settings reload hook. Channels are matched to
+    their settings by port, new channels are opened. Returns True if a channel needs a restart or has been deleted.
+    """
+    global serial_routes  # pylint: disable=global-statement
+    restart = False
+    ports = set()
+    for device in settings['serial_channels']:
+        ports.add(device['port'])
+        channel = next((channel for channel in serial_channels.values() if channel.port_name() == device['port']),
+                       None)
+        if channel is not None:
+            restart = channel.reload(device) or restart
+        elif device['api-name'] in serial_channels:
+            restart = True
+        else:
+            serial_channels[device['api-name']] = SerialConnection(device)
+    if any(channel.port_name() not in ports for channel in serial_channels.values()):
+        logger.warning('Serial Class: serial channel deleted, a restart is needed')
+        restart = True
+    serial_routes = build_serial_routes()
+    return restart
+
+
+register_reload(reload_serial, ('serial_channels', 'serial_debug'))
 
 
 def serial_api_checker(item):
@@ -475,10 +868,7 @@ def serial_api_checker(item):
     provided item's prefix matches the name of any channel. If a match is found,
     the function returns True, otherwise it returns False.
     """
-    for channel in serial_channels.values():
-        if item[:len(channel.name())] == channel.name():
-            return True
-    return False
+    return serial_route(item) is not None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+"""
+Serial Port Discovery
+
+Lists the serial ports of the system for the serial config page and finds a USB adapter again by its serial number.
+On linux the ports are described from their /sys/class/tty entries, so discovery never opens a device, and the
+result is cached between page loads.
+
+Functions:
+    serial_port_details: Discovered ports with driver and USB vid/pid/serial number
+    serial_port_device: The description of a single port
+    serial_ports: Auto-discover available serial ports
+"""
+from threading import Lock
+from time import time
+import glob
+import os
+import sys
+from logmanager import logger
+
+SYSFS_TTY = '/sys/class/tty'
+PORT_CACHE_TTL = 30  # seconds discovered ports are cached for if /sys/class/tty does not change
+
+
+def read_sysfs(path):
+    """
+    Reads a single value sysfs attribute, returns an empty string if the attribute does not exist.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as attribute:
+            return attribute.read().strip()
+    except OSError:
+        return ''
+
+
+def sysfs_port_info(tty_name):
+    """
+    Builds the description of a tty from its /sys/class/tty entry without opening the device. Returns None for
+    virtual terminals (no backing device) and for 8250 placeholder ports that have no UART behind them. USB
+    adapters are described by the vid, pid, serial number, manufacturer and product of the parent USB device.
+    """
+    tty_path = os.path.join(SYSFS_TTY, tty_name)
+    device_path = os.path.join(tty_path, 'device')
+    if not os.path.exists(device_path):
+        return None
+    if tty_name.startswith('ttyS') and read_sysfs(os.path.join(tty_path, 'type')) in ('', '0'):
+        return None
+    device_path = os.path.realpath(device_path)
+    while os.path.basename(os.path.realpath(os.path.join(device_path, 'subsystem'))) == 'serial-base':
+        device_path = os.path.dirname(device_path)  # newer kernels add serial-base port and ctrl devices
+    port_info = {'port': '/dev/%s' % tty_name,
+                 'driver': os.path.basename(os.path.realpath(os.path.join(device_path, 'driver'))),
+                 'subsystem': os.path.basename(os.path.realpath(os.path.join(device_path, 'subsystem'))),
+                 'vid': '', 'pid': '', 'serial_number': '', 'manufacturer': '', 'product': ''}
+    usb_path = device_path
+    for _ in range(3):  # the usb device is the parent of the interface (or of the usb-serial port)
+        if os.path.exists(os.path.join(usb_path, 'idVendor')):
+            port_info['vid'] = read_sysfs(os.path.join(usb_path, 'idVendor'))
+            port_info['pid'] = read_sysfs(os.path.join(usb_path, 'idProduct'))
+            port_info['serial_number'] = read_sysfs(os.path.join(usb_path, 'serial'))
+            port_info['manufacturer'] = read_sysfs(os.path.join(usb_path, 'manufacturer'))
+            port_info['product'] = read_sysfs(os.path.join(usb_path, 'product'))
+            break
+        usb_path = os.path.dirname(usb_path)
+    return port_info
+
+
+def serial_port_details(refresh=False):
+    """ Lists the serial ports available on the system with their driver and USB details
+
+        On linux the ports are read from /sys/class/tty so no device is opened. The result is cached and only
+        rebuilt when the set of ttys changes (e.g. a USB adapter is plugged in), the cache is older than
+        PORT_CACHE_TTL seconds or refresh is True. Two adapters that swap tty names leave the set of ttys
+        unchanged, so a caller that binds a port to an adapter refreshes the cache.
+
+        :raises EnvironmentError:
+            On unsupported or unknown platforms
+        :returns:
+            A list of dicts describing the serial ports available on the system
+    """
+    if sys.platform.startswith('win'):
+        return [port_details('COM%s' % (i + 1)) for i in range(8)]  # work around for testing on windows
+    if sys.platform.startswith('darwin'):
+        return [port_details(serial_port) for serial_port in glob.glob('/dev/tty.*')]
+    if not (sys.platform.startswith('linux') or sys.platform.startswith('cygwin')):
+        raise EnvironmentError('Unsupported platform')
+    with port_cache['lock']:
+        tty_names = frozenset(os.listdir(SYSFS_TTY))
+        if refresh or tty_names != port_cache['ttys'] or time() - port_cache['time'] > PORT_CACHE_TTL:
+            detected_ports = []
+            for tty_name in sorted(tty_names):
+                port_info = sysfs_port_info(tty_name)
+                if port_info:
+                    detected_ports.append(port_info)
+            port_cache['ports'] = detected_ports
+            port_cache['ttys'] = tty_names
+            port_cache['time'] = time()
+            logger.debug('Serial Class: serial port discovery found %s', [item['port'] for item in detected_ports])
+        return port_cache['ports']
+
+
+def port_details(serial_port):
+    """
+    Returns the description of a port on platforms without sysfs, only the port name is known.
+    """
+    return {'port': serial_port, 'driver': '', 'subsystem': '', 'vid': '', 'pid': '', 'serial_number': '',
+            'manufacturer': '', 'product': ''}
+
+
+def serial_port_device(port_id):
+    """
+    Returns the discovered description of a single port, or a description with only the port name if the port
+    is not currently present.
+    """
+    for port_info in serial_port_details():
+        if port_info['port'] == port_id:
+            return port_info
+    return port_details(port_id)
+
+
+def serial_ports():
+    """ Lists serial port names available on the system
+
+        :raises EnvironmentError:
+            On unsupported or unknown platforms
+        :returns:
+            A list of the serial ports available on the system
+    """
+    return [port_info['port'] for port_info in serial_port_details()]
+
+
+port_cache = {'lock': Lock(), 'ttys': frozenset(), 'time': 0, 'ports': []}
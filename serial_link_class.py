@@ -0,0 +1,215 @@
+"""
+Serial channel supervision and poll scheduling
+
+This module holds the two pieces of a serial channel that run on timers rather than on the port itself: the
+supervisor that reopens a lost port with exponential backoff, and the schedule that decides how long an interactive
+channel waits between listener polls. SerialConnection owns one of each.
+
+Classes:
+    ReconnectSupervisor: Connection state and backoff reconnects of a channel
+    PollSchedule: Fixed, adaptive and burst listener poll intervals of a channel
+"""
+from threading import Thread, Lock, Event
+from logmanager import logger
+from scheduler_class import scheduler
+
+FAST_POLL_INTERVAL = 0.5  # default seconds between adaptive polls while values are changing
+RECONNECT_MIN = 1  # seconds before the first reconnect attempt
+RECONNECT_MAX = 30  # longest delay between reconnect attempts
+
+
+class ReconnectSupervisor:
+    """
+    Supervises the connection of a serial channel, which moves between 'connecting', 'connected' and 'reconnecting'.
+    A port that is missing at start up or fails later is retried with exponential backoff timed by the shared scheduler,
+    doubling the delay from RECONNECT_MIN up to RECONNECT_MAX seconds between attempts. open_port is called for each
+    attempt and returns True when the port is connected.
+
+    Opening a port scans sysfs and may write the settings, so the attempts run on a reconnect thread of the channel.
+    The scheduler only wakes that thread when an attempt is due, its own thread never blocks on a port.
+    """
+    def __init__(self, port, open_port):
+        self._port = port
+        self._open_port = open_port
+        self._lock = Lock()
+        self._connected = Event()
+        self._state = 'connecting'
+        self._reconnects = 0
+        self._last_error = ''
+        self._retry_delay = 0
+        self._attempt_due = Event()
+        self._thread = None
+
+    def connected(self):
+        """Records that the port has been opened."""
+        with self._lock:
+            self._state = 'connected'
+            self._retry_delay = 0
+            self._connected.set()
+
+    def failed(self, error):
+        """Records the error of a failed attempt to open the port."""
+        self._last_error = str(error)
+
+    def lost(self, error):
+        """
+        Records that a connected port has failed. Returns True if the port was connected, False if the channel is
+        already reconnecting.
+        """
+        with self._lock:
+            if self._state != 'connected':
+                return False
+            self._state = 'reconnecting'
+            self._connected.clear()
+            self._last_error = str(error)
+        return True
+
+    def is_connected(self):
+        """Returns True while the port is connected."""
+        return self._connected.is_set()
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds for the port to be connected, returns True if it is."""
+        return self._connected.wait(timeout)
+
+    def start(self):
+        """Schedules the first reconnect attempt, unless attempts are already scheduled."""
+        with self._lock:
+            if self._retry_delay > 0:
+                return
+            self._retry_delay = RECONNECT_MIN
+            if self._thread is None:
+                self._thread = Thread(target=self._reconnector, daemon=True)
+                self._thread.name = 'Serial reconnect %s' % self._port
+                self._thread.start()
+        scheduler.call_later(RECONNECT_MIN, self._attempt_due.set)
+
+    def _reconnector(self):
+        """
+        Makes a reconnect attempt each time one is due and schedules the next one with a doubled delay if the port
+        does not open.
+        """
+        while True:
+            self._attempt_due.wait()
+            self._attempt_due.clear()
+            lost = self._state == 'reconnecting'
+            if self._open_port():
+                if lost:
+                    self._reconnects += 1
+                    logger.info('Serial Class: %s reconnected', self._port)
+                continue
+            with self._lock:
+                self._retry_delay = min(self._retry_delay * 2, RECONNECT_MAX)
+                delay = self._retry_delay
+            scheduler.call_later(delay, self._attempt_due.set)
+
+    def health(self):
+        """Returns the connection state, reconnect count, last error and current retry delay."""
+        return {'state': self._state, 'reconnects': self._reconnects, 'last_error': self._last_error,
+                'retry_delay': self._retry_delay}
+
+
+class PollSchedule:
+    """
+    The interval between the listener polls of an interactive channel. Polls are either fixed, every poll_interval
+    seconds, or adaptive. An adaptive channel polls every fast_poll_interval seconds while any value moves by more than
+    change_threshold or while an associated output is active (see set_active), and doubles the interval after each
+    stable poll until it reaches poll_interval. Intervals may be fractions of a second. During a burst the interval
+    is 0, and a fixed interval set with override() takes precedence over everything else.
+    """
+    def __init__(self, device):
+        self._wake = Event()
+        self._waker = None
+        self._output_active = False
+        self._override = 0
+        self._burst = False
+        self.configure(device)
+        self._interval = self._default_interval
+
+    def configure(self, device):
+        """Applies the polling settings of the channel."""
+        self._default_interval = device['poll_interval']
+        self._adaptive = device.get('polling', 'fixed') == 'adaptive'
+        self._fast_interval = min(device.get('fast_poll_interval', FAST_POLL_INTERVAL), self._default_interval)
+        self._change_threshold = device.get('change_threshold', 0)
+
+    def interval(self):
+        """Returns the current poll interval in seconds."""
+        return self._interval
+
+    def bursting(self):
+        """Returns True while a burst is running."""
+        return self._burst
+
+    def changed(self, previous_values, listener_values):
+        """
+        Compares a new set of listener values with the previous ones. Numeric values have changed when they move by
+        more than the change threshold, any other value has changed when it is different.
+        """
+        previous = {listener_value['name']: listener_value['value'] for listener_value in previous_values}
+        for listener_value in listener_values:
+            old_value = previous.get(listener_value['name'])
+            new_value = listener_value['value']
+            if isinstance(new_value, (int, float)) and isinstance(old_value, (int, float)):
+                if abs(new_value - old_value) > self._change_threshold:
+                    return True
+            elif new_value != old_value:
+                return True
+        return False
+
+    def adapt(self, changed):
+        """
+        Sets the interval to the next poll. Adaptive channels drop to the fast interval when values changed or an
+        output is active and double the interval after each stable poll up to the configured poll interval.
+        """
+        if self._burst:
+            self._interval = 0
+        elif self._override > 0:
+            self._interval = self._override
+        elif not self._adaptive:
+            self._interval = self._default_interval
+        elif changed or self._output_active:
+            self._interval = self._fast_interval
+        else:
+            self._interval = min(self._interval * 2, self._default_interval)
+
+    def set_active(self, active):
+        """
+        Tells an adaptive channel whether an associated output (e.g. the laser) is active. While it is active the
+        channel polls at the fast interval, the next poll is brought forward when the output is switched on.
+        """
+        self._output_active = bool(active)
+        if self._output_active and self._adaptive:
+            self._interval = self._fast_interval
+            self.wake()
+
+    def set_burst(self, active):
+        """Starts or stops a burst, polls run back to back while it is running."""
+        if active:
+            self._burst = True
+            self._interval = 0
+        elif self._burst:
+            self._burst = False
+            self.adapt(True)
+        self.wake()
+
+    def override(self, value):
+        """Fixes the poll interval to the given value, 0 returns to the fixed or adaptive interval."""
+        self._override = value if value > 0 else 0
+        self._interval = self._override or self._default_interval
+        self.wake()
+
+    def set_waker(self, callback):
+        """Sets a callback that wake() calls as well, for a poller that waits on its own event (e.g. in asyncio)."""
+        self._waker = callback
+
+    def wake(self):
+        """Brings the next poll forward."""
+        self._wake.set()
+        if self._waker is not None:
+            self._waker()
+
+    def wait(self, timeout=None):
+        """Waits for the current poll interval (or timeout seconds) or until the next poll is brought forward."""
+        self._wake.wait(self._interval if timeout is None else timeout)
+        self._wake.clear()
@@ -0,0 +1,202 @@
+"""
+Serial Message Definitions and Frame Parsing
+
+This module holds the parts of the serial stack that work on bytes only and never touch a port: the compiled form
+of the message definitions saved in the settings, the decoding of replies and the incremental frame parser of the
+listener mode channels. serial_class compiles the messages of each channel with compile_message. The transaction
+priorities are here as well, so both serial engines share them without importing each other.
+
+Classes:
+    SerialMessage: Immutable, pre-decoded form of a message definition
+    FrameParser: Incremental parser that extracts listener frames from a byte stream
+
+Functions:
+    str_encode/str_decode: Base64 string encoding/decoding
+    decode_reply: Converts a binary reply into a string
+    compile_message: Compiles a message definition from the settings file
+    field_format: Validates a struct format string
+"""
+from typing import NamedTuple, Optional
+from struct import Struct, error as StructError
+from base64 import b64decode, b64encode
+from logmanager import logger
+
+DEFAULT_REPLY_GAP = 50  # ms of silence after the last received byte that ends a reply
+PORT_TIMEOUT = 1  # seconds to wait for a reply to start
+MAX_FRAME = 4096  # bytes a partial listener frame may grow to before it is abandoned
+PRIORITY_API = 0  # interactive api commands are served first
+PRIORITY_POLL = 10  # listener polls wait behind any queued api commands
+
+
+def str_encode(string):
+    """
+    Encodes a given string to its Base64 representation.
+
+    This function takes a string and encodes it using Base64. The encoding
+    is performed by first converting the string to its byte representation
+    in UTF-8, then applying Base64 encoding to it, and finally decoding
+    the resulting bytes back into a string.
+    """
+    return b64encode(string).decode('utf-8')
+
+
+def str_decode(string):
+    """
+    Decodes a Base64 encoded string into a UTF-8 string.
+
+    This function takes a string that is Base64 encoded, decodes it from
+    Base64, and then decodes the resulting bytes into a UTF-8 string.
+    """
+    return b64decode(string)
+
+
+def decode_reply(binary_data):
+    """
+    Converts a binary reply into a string, replies that are not valid utf-8 are decoded as iso-8859-1 so that every
+    byte is preserved.
+    """
+    try:
+        return str(binary_data, 'utf-8')
+    except UnicodeDecodeError:
+        return str(binary_data, 'iso-8859-1')
+
+
+class SerialMessage(NamedTuple):
+    """
+    A serial message definition compiled from the base64 settings format. Strings are held as raw bytes and the
+    reply framing is resolved to a read size and a gap in seconds so that transactions do no decoding.
+    """
+    name: str
+    api_command: str
+    string1: bytes
+    string2: bytes
+    start: int
+    length: int
+    reply_size: int
+    terminator: bytes
+    gap: float
+    timeout: float
+    field: Optional[Struct]
+    scale: float
+    offset: float
+
+    def value(self, binary_data, position):
+        """
+        Returns the value of the message from binary data. Messages with a field format are unpacked at the position
+        and returned as a number (raw * scale + offset), other messages return the data as a string starting at the
+        position and ending at the message length. A reply too short for the field returns an empty string.
+        """
+        if self.field is None:
+            return decode_reply(binary_data)[position:self.length]
+        try:
+            raw = self.field.unpack_from(binary_data, position)[0]
+        except StructError:
+            return ''
+        if self.scale == 1 and self.offset == 0:
+            return raw
+        return round(raw * self.scale + self.offset, 6)
+
+
+def compile_message(message, read_buffer):
+    """
+    Compiles a message definition from the settings file into a SerialMessage. Messages saved before the reply
+    framing and field fields existed fall back to the defaults.
+    """
+    reply_length = message.get('reply-length', 0)
+    fmt_spec = message.get('format', '')
+    return SerialMessage(name=message['name'], api_command=message['api-command'],
+                         string1=b64decode(message['string1']), string2=b64decode(message['string2']),
+                         start=message['start'], length=message['length'],
+                         reply_size=reply_length if reply_length > 0 else read_buffer,
+                         terminator=b64decode(message.get('terminator', '')),
+                         gap=message.get('gap', DEFAULT_REPLY_GAP) / 1000,
+                         timeout=message.get('timeout', PORT_TIMEOUT * 1000) / 1000,
+                         field=Struct(fmt_spec) if fmt_spec else None,
+                         scale=message.get('scale', 1), offset=message.get('offset', 0))
+
+
+def field_format(format_string):
+    """
+    Validates a struct format string entered on the serial config page (e.g. '>H' for a big-endian unsigned 16 bit
+    value). Returns the format, or an empty string if it is blank or not a valid struct format.
+    """
+    format_string = format_string.strip()
+    if not format_string:
+        return ''
+    try:
+        Struct(format_string)
+        return format_string
+    except StructError:
+        logger.warning('Serial Class: invalid field format "%s" ignored', format_string)
+        return ''
+
+
+class FrameParser:
+    """
+    Incremental parser for listener mode channels. Bytes are appended to a buffer that is kept across reads so a
+    frame split between two reads is still found. Each call to feed() only searches the bytes that have not already
+    been searched (plus the overlap needed to catch a search string split across reads) and returns every complete
+    frame in the order received.
+
+    A frame starts with the message search string (string 1). It ends at the message terminator if one is defined,
+    otherwise after length - 1 bytes of data, matching the values produced by earlier versions, or after the size of
+    the field for messages with a field format.
+    """
+    def __init__(self, messages):
+        self._messages = tuple(message for message in messages if message.string1)
+        self._overlap = max((len(message.string1) for message in self._messages), default=1) - 1
+        self._buffer = bytearray()
+        self._search_from = 0
+        self._pending = None
+
+    def feed(self, binary_data, timestamp):
+        """
+        Adds newly read bytes to the buffer and returns a list of (message, value bytes, timestamp) tuples for
+        every frame completed by this data.
+        """
+        self._buffer.extend(binary_data)
+        frames = []
+        while True:
+            if self._pending is None:
+                self._pending = self._next_start()
+                if self._pending is None:
+                    break
+            message, position = self._pending
+            value_start = position + len(message.string1)
+            if message.terminator:
+                value_end = self._buffer.find(message.terminator, value_start)
+                frame_end = value_end + len(message.terminator)
+            else:
+                if message.field is not None:
+                    value_end = value_start + message.field.size
+                else:
+                    value_end = value_start + max(message.length - 1, 0)
+                frame_end = value_end if value_end <= len(self._buffer) else -1
+            if value_end < 0 or frame_end < 0:
+                if len(self._buffer) - position > MAX_FRAME:
+                    self._search_from = position + 1
+                    self._pending = None
+                    continue
+                break
+            frames.append((message, bytes(self._buffer[value_start:value_end]), timestamp))
+            del self._buffer[:frame_end]
+            self._search_from = 0
+            self._pending = None
+        if self._pending is None and len(self._buffer) > self._overlap:
+            del self._buffer[:len(self._buffer) - self._overlap]
+            self._search_from = 0
+        return frames
+
+    def _next_start(self):
+        """Finds the earliest search string in the unsearched part of the buffer."""
+        first_message = None
+        first_position = -1
+        for message in self._messages:
+            position = self._buffer.find(message.string1, self._search_from)
+            if position > -1 and (first_message is None or position < first_position):
+                first_message = message
+                first_position = position
+        if first_message is None:
+            self._search_from = max(len(self._buffer) - self._overlap, 0)
+            return None
+        return first_message, first_position
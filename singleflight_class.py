@@ -0,0 +1,84 @@
+"""
+Single-flight coalescing for hardware reads
+
+Gunicorn serves the API from many threads, so several dashboards polling the same status item at the same moment
+would each read the GPIO, ADC or serial device. A SingleFlight object lets concurrent identical requests share one
+in-flight read: the first caller (the leader) performs the read and every caller that arrives while it is running
+waits for, and receives, the same result. An optional freshness window also returns the last result to callers that
+arrive shortly after a read finished, so the hardware load stays flat however many clients are polling.
+
+Classes:
+    SingleFlight: Coalesces concurrent calls that share a key into one call
+"""
+from concurrent.futures import Future
+from threading import Lock
+from time import monotonic
+
+MAX_RESULTS = 256  # most recent results kept for the freshness window
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single call of the underlying function.
+
+    Results are shared between callers and must be treated as read only. Exceptions raised by the leader are
+    re-raised in every caller waiting on the same key, and failed calls are never cached. A result is kept only for
+    its freshness window: expired results are dropped whenever a new result is stored, and at most MAX_RESULTS are
+    kept, so keys built from arbitrary commands cannot grow the map without limit.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+        self._results = {}
+        self._stats = {'calls': 0, 'shared': 0, 'cached': 0}
+
+    def run(self, key, freshness, function, *args):
+        """
+        Returns function(*args), sharing the call with any other caller using the same key. A result completed less
+        than freshness seconds ago is returned without calling the function again, 0 disables the freshness window.
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and monotonic() - cached[0] < freshness:
+                self._stats['cached'] += 1
+                return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+                self._stats['calls'] += 1
+            else:
+                self._stats['shared'] += 1
+        if not leader:
+            return call.result()
+        try:
+            result = function(*args)
+        except BaseException as error:
+            with self._lock:
+                del self._calls[key]
+            call.set_exception(error)
+            raise
+        with self._lock:
+            self._results.pop(key, None)
+            if freshness > 0:
+                self._store(key, result, freshness)
+            del self._calls[key]
+        call.set_result(result)
+        return result
+
+    def _store(self, key, result, freshness):
+        """Keeps a result for the freshness window, dropping expired and the oldest results. Called with the lock held."""
+        now = monotonic()
+        for expired in [stored for stored, (completed, _) in self._results.items() if now - completed >= freshness]:
+            del self._results[expired]
+        while len(self._results) >= MAX_RESULTS:
+            del self._results[next(iter(self._results))]
+        self._results[key] = (now, result)
+
+    def stats(self):
+        """
+        Returns the number of hardware reads made and the number of requests served from a shared or cached read.
+        """
+        with self._lock:
+            return dict(self._stats)
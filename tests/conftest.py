@@ -0,0 +1,10 @@
+"""
+Test configuration. Modules that load the application settings read and write settings.json and the log files in
+the working directory, so the tests run in a temporary directory with the repository on the import path.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix='controller-tests-'))
@@ -0,0 +1,69 @@
+"""Tests for the signal filters in filter_class"""
+import random
+import statistics
+
+import numpy
+import pytest
+
+from filter_class import MovingAverageFilter, MedianFilter, SavitzkyGolayFilter
+
+
+def polyfit_value(samples):
+    """Value at the newest sample of a quadratic least squares fit, calculated by numpy."""
+    positions = numpy.arange(len(samples))
+    return numpy.polyval(numpy.polyfit(positions, samples, 2), positions[-1])
+
+
+@pytest.mark.parametrize('window', [3, 5, 10, 31])
+def test_savitzky_golay_matches_polyfit(window):
+    """The filter output matches a numpy quadratic fit of the window for a noisy ramp."""
+    noise = random.Random(window)
+    sg_filter = SavitzkyGolayFilter(window, 20.0)
+    samples = [20.0] * window
+    for step in range(2000):
+        value = 1000 + 0.01 * step * step + noise.uniform(-5, 5)
+        samples = samples[1:] + [value]
+        assert sg_filter.add(value) == pytest.approx(polyfit_value(samples), abs=1e-6)
+
+
+def test_savitzky_golay_does_not_drift():
+    """After many large samples the output still matches a fresh fit, rounding errors do not build up in the sums."""
+    noise = random.Random(1)
+    window = 7
+    sg_filter = SavitzkyGolayFilter(window, 0.0)
+    for _ in range(200000):
+        sg_filter.add(1e6 + noise.uniform(-1e3, 1e3))
+    samples = [1500.0 + step for step in range(window)]
+    for value in samples:
+        result = sg_filter.add(value)
+    assert result == pytest.approx(polyfit_value(samples), abs=1e-6)
+
+
+def test_savitzky_golay_small_window_is_average():
+    """A window of fewer than three samples is a moving average."""
+    sg_filter = SavitzkyGolayFilter(2, 0.0)
+    sg_filter.add(4.0)
+    assert sg_filter.add(6.0) == pytest.approx(5.0)
+
+
+def test_moving_average_does_not_drift():
+    """After many large samples the running sum still gives the exact mean of the window."""
+    noise = random.Random(2)
+    average = MovingAverageFilter(5, 0.0)
+    for _ in range(200000):
+        average.add(1e6 + noise.uniform(-1e3, 1e3))
+    for value in (1.0, 2.0, 3.0, 4.0, 5.0):
+        result = average.add(value)
+    assert result == pytest.approx(3.0, abs=1e-9)
+
+
+@pytest.mark.parametrize('window', [1, 4, 5])
+def test_median_matches_statistics(window):
+    """The filter output is the median of the window, including windows holding repeated values."""
+    noise = random.Random(window)
+    median_filter = MedianFilter(window, 0.0)
+    samples = [0.0] * window
+    for _ in range(500):
+        value = float(noise.randint(0, 9))
+        samples = samples[1:] + [value]
+        assert median_filter.add(value) == statistics.median(samples)
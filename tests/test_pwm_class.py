@@ -0,0 +1,79 @@
+"""Tests for the sysfs hardware PWM output in pwm_class"""
+import pytest
+
+import pwm_class
+from pwm_class import SysfsPwm
+
+
+@pytest.fixture(name='sysfs')
+def fixture_sysfs(tmp_path):
+    """A stand-in sysfs PWM chip with channel 0 already exported."""
+    channel = tmp_path / 'pwmchip0' / 'pwm0'
+    channel.mkdir(parents=True)
+    for name in ('period', 'duty_cycle', 'enable'):
+        (channel / name).write_text('0')
+    (tmp_path / 'pwmchip0' / 'export').write_text('')
+    return tmp_path
+
+
+def read(sysfs, name):
+    """Returns the value written to a file of channel 0."""
+    return int((sysfs / 'pwmchip0' / 'pwm0' / name).read_text())
+
+
+def test_start(sysfs):
+    """Starting the output writes the period and duty cycle in ns and enables the channel."""
+    pwm = SysfsPwm(str(sysfs), 'pwmchip0', 0)
+    pwm.start(25, 500)
+    assert read(sysfs, 'period') == 2000000
+    assert read(sysfs, 'duty_cycle') == 500000
+    assert read(sysfs, 'enable') == 1
+
+
+def test_duty_cycle_change(sysfs):
+    """A duty cycle change keeps the period, duty cycles over 100% are clamped to the period."""
+    pwm = SysfsPwm(str(sysfs), 'pwmchip0', 0)
+    pwm.start(25, 500)
+    pwm.set_duty_cycle(60)
+    assert read(sysfs, 'period') == 2000000
+    assert read(sysfs, 'duty_cycle') == 1200000
+    pwm.set_duty_cycle(150)
+    assert read(sysfs, 'duty_cycle') == 2000000
+
+
+def test_frequency_change_shorter_than_duty(sysfs, monkeypatch):
+    """
+    A new period shorter than the current duty cycle is only written after the duty cycle is cleared, the kernel
+    rejects a period shorter than the duty cycle.
+    """
+    pwm = SysfsPwm(str(sysfs), 'pwmchip0', 0)
+    pwm.start(25, 500)
+    writes = []
+    write = pwm._write  # pylint: disable=protected-access
+
+    def recording_write(name, value):
+        """Records each sysfs write and passes it on."""
+        writes.append((name, value))
+        write(name, value)
+
+    monkeypatch.setattr(pwm, '_write', recording_write)
+    pwm.start(50, 5000)
+    assert writes == [('duty_cycle', 0), ('period', 200000), ('duty_cycle', 100000), ('enable', 1)]
+    assert read(sysfs, 'period') == 200000
+    assert read(sysfs, 'duty_cycle') == 100000
+
+
+def test_stop(sysfs):
+    """Stopping the output disables the channel."""
+    pwm = SysfsPwm(str(sysfs), 'pwmchip0', 0)
+    pwm.start(25, 500)
+    pwm.stop()
+    assert read(sysfs, 'enable') == 0
+
+
+def test_export_timeout(sysfs, monkeypatch):
+    """A channel that does not appear after the export raises OSError."""
+    monkeypatch.setattr(pwm_class, 'EXPORT_TIMEOUT', 0.1)
+    with pytest.raises(OSError):
+        SysfsPwm(str(sysfs), 'pwmchip0', 1)
+    assert (sysfs / 'pwmchip0' / 'export').read_text() == '1'
@@ -0,0 +1,71 @@
+"""Tests for the listener frame parser and message compilation in serial_message_class"""
+from base64 import b64encode
+
+from serial_message_class import FrameParser, compile_message, MAX_FRAME
+
+
+def message(name, string1, length=0, terminator=b'', field_format=''):
+    """A listener message compiled from the settings format."""
+    return compile_message({'name': name, 'api-command': '', 'string1': b64encode(string1).decode(),
+                            'string2': '', 'start': 0, 'length': length,
+                            'terminator': b64encode(terminator).decode(), 'format': field_format}, 1024)
+
+
+def values(frames):
+    """The (name, value bytes) of each frame."""
+    return [(frame_message.name, value) for frame_message, value, _ in frames]
+
+
+def test_frame_split_between_reads():
+    """A frame split between two reads is returned once its terminator arrives."""
+    parser = FrameParser([message('temperature', b'T=', terminator=b'\r\n')])
+    assert not parser.feed(b'T=12', 1.0)
+    frames = parser.feed(b'3.4\r\n', 2.0)
+    assert values(frames) == [('temperature', b'123.4')]
+    assert frames[0][2] == 2.0
+
+
+def test_search_string_split_between_reads():
+    """A search string split between two reads is still found."""
+    parser = FrameParser([message('temperature', b'TEMP=', terminator=b'\r')])
+    assert not parser.feed(b'\x00\x00TE', 1.0)
+    assert values(parser.feed(b'MP=7\r', 2.0)) == [('temperature', b'7')]
+
+
+def test_several_frames_in_one_read():
+    """Every frame completed by a read is returned, in the order received."""
+    parser = FrameParser([message('temperature', b'T=', terminator=b'\r\n'),
+                          message('emissivity', b'E=', terminator=b'\r\n')])
+    frames = parser.feed(b'T=1\r\nE=0.95\r\nT=2\r\n', 1.0)
+    assert values(frames) == [('temperature', b'1'), ('emissivity', b'0.95'), ('temperature', b'2')]
+
+
+def test_garbage_between_frames():
+    """Bytes that are not part of a frame are skipped, before, between and after frames."""
+    parser = FrameParser([message('temperature', b'T=', terminator=b'\r\n')])
+    frames = parser.feed(b'\xff\x00noise T=1\r\n##garbage##T=2\r\n\x13junk', 1.0)
+    assert values(frames) == [('temperature', b'1'), ('temperature', b'2')]
+    assert values(parser.feed(b'T=3\r\n', 2.0)) == [('temperature', b'3')]
+
+
+def test_fixed_length_frames():
+    """Without a terminator a frame ends length - 1 bytes after the search string."""
+    parser = FrameParser([message('position', b'L:', length=4)])
+    assert values(parser.feed(b'zzL:abcL:de', 1.0)) == [('position', b'abc')]
+    assert values(parser.feed(b'f', 2.0)) == [('position', b'def')]
+
+
+def test_field_frames():
+    """A message with a field format ends after the size of the field and its value is a number."""
+    temperature = message('temperature', b'P', field_format='>H')
+    parser = FrameParser([temperature])
+    frames = parser.feed(b'\x00P\x07\xd0P\x07', 1.0)
+    assert values(frames) == [('temperature', b'\x07\xd0')]
+    assert temperature.value(frames[0][1], 0) == 2000
+
+
+def test_unterminated_frame_is_abandoned():
+    """A frame whose terminator never arrives is dropped after MAX_FRAME bytes, later frames are still found."""
+    parser = FrameParser([message('temperature', b'T=', terminator=b'\r\n')])
+    assert not parser.feed(b'T=' + b'9' * MAX_FRAME, 1.0)
+    assert values(parser.feed(b'T=5\r\n', 2.0)) == [('temperature', b'5')]
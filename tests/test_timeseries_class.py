@@ -0,0 +1,86 @@
+"""Tests for the time-series store in timeseries_class"""
+import pytest
+
+from timeseries_class import TimeSeries, Downsampler, RECORD, INDEX_STRIDE
+
+
+@pytest.fixture(name='series')
+def fixture_series(tmp_path):
+    """A series with a 100 sample RAM ring and a record file in a temporary directory."""
+    return TimeSeries('test', str(tmp_path), 100)
+
+
+def fill(series, count, start=1000.0):
+    """Appends count samples one second apart, the value is the sample number, and flushes them to the file."""
+    for number in range(count):
+        series.append(start + number, number)
+    series.flush()
+
+
+def test_downsampler_keeps_raw_samples():
+    """With no buckets the samples are returned as they are."""
+    samples = Downsampler(0, 10, 0)
+    for timestamp in range(5):
+        samples.add(timestamp, timestamp * 2)
+    assert samples.result() == [[0, 0], [1, 2], [2, 4], [3, 6], [4, 8]]
+
+
+def test_downsampler_buckets():
+    """Each bucket keeps its start time, mean, minimum and maximum."""
+    samples = Downsampler(0, 10, 2)
+    for timestamp, value in ((0, 1), (1, 3), (4, 2), (5, 10), (9, 20)):
+        samples.add(timestamp, value)
+    assert samples.result() == [[0, 2, 1, 3], [5, 15, 10, 20]]
+
+
+def test_append_moves_late_samples_forward(series):
+    """A sample older than the last one is recorded at the time of the last one."""
+    series.append(1000, 1)
+    series.append(990, 2)
+    assert series.query(0, 2000, 10)['values'] == [[1000, 1], [1000, 2]]
+
+
+def test_query_reads_file_and_ring(series):
+    """A query spanning the file and the RAM ring returns every sample in the range once, in time order."""
+    fill(series, 3 * INDEX_STRIDE)
+    result = series.query(1000 + 10, 1000 + 3 * INDEX_STRIDE - 5, 10000)
+    assert result['samples'] == 3 * INDEX_STRIDE - 15
+    assert not result['downsampled']
+    assert [value for _, value in result['values']] == list(range(10, 3 * INDEX_STRIDE - 5))
+
+
+def test_query_downsamples(series):
+    """More samples than points are reduced to points buckets."""
+    fill(series, 1000)
+    result = series.query(1000, 2000, 10)
+    assert result['downsampled']
+    assert len(result['values']) == 10
+    assert result['values'][0] == [1000, 49.5, 0, 99]
+
+
+def test_records_are_packed(series):
+    """records() returns the packed (time, value) records of the range."""
+    fill(series, 500)
+    records = list(RECORD.iter_unpack(series.records(1100, 1450)))
+    assert records == [(1000.0 + number, float(number)) for number in range(100, 450)]
+
+
+def test_reopen_keeps_records(series, tmp_path):
+    """A series opened again finds the records written before, and drops a partly written last record."""
+    fill(series, 300)
+    with open(tmp_path / 'test.ts', 'ab') as record_file:
+        record_file.write(b'\x00' * 5)
+    reopened = TimeSeries('test', str(tmp_path), 100)
+    values = reopened.query(0, 5000, 1000)['values']
+    assert values == [[1000 + number, number] for number in range(300)]
+
+
+def test_expire(series):
+    """Records older than the cut off are removed, and only once more than slack seconds have expired."""
+    fill(series, 2 * INDEX_STRIDE)
+    series.expire(1000 + 100, slack=200)
+    assert series.query(0, 5000, 10000)['samples'] == 2 * INDEX_STRIDE
+    series.expire(1000 + 500, slack=200)
+    values = series.query(0, 5000, 10000)['values']
+    assert len(values) == 2 * INDEX_STRIDE - 500
+    assert values[0] == [1500, 500]
@@ -0,0 +1,398 @@
+"""
+Embedded time-series store for the controller history
+
+This module keeps the history of the measured and controlled values (pyrometer temperature, laser state and power,
+door and key interlocks, analogue channels). Each series keeps its most recent samples in a fixed size in-RAM ring
+and appends every sample to its own binary file of fixed-width records (time and value as little endian doubles).
+Records are written in time order, so the file itself is sorted. A sparse index holding the time of every
+INDEX_STRIDE-th record is kept in RAM, and queries memory map the file and binary search it, so only the records in
+the requested time range are ever read.
+
+Values are either pushed with record() (e.g. every pyrometer reading) or pulled by a recorder job on the shared
+scheduler that samples the registered sources every settings['history_interval'] seconds.
+
+Each record takes 16 bytes, so a series sampled every second grows by about 1.4 MB a day. Records older than
+settings['history_retention_days'] are removed by an hourly job that rewrites the file once a day's worth of records
+has expired. A retention of 0 keeps the history forever and the files grow without limit.
+
+All disk writes (the flushes and the retention rewrites) run on a history writer thread. The scheduler jobs only
+sample the sources into RAM and wake the writer, so SD card latency never delays the other scheduled jobs such as
+the PID loop or the laser and interlock timers.
+
+Classes:
+    TimeSeries: RAM ring and record file of a single series
+    Downsampler: Reduces the samples of a query to equal time buckets
+    TimeSeriesStore: The set of series, the recorder job and the query API
+
+Attributes:
+    history: The application time-series store
+"""
+import atexit
+import os
+from array import array
+from bisect import bisect_left
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from threading import Thread, Lock, Event
+from time import time
+from logmanager import logger
+from scheduler_class import scheduler
+from app_control import settings
+
+RECORD = Struct('<dd')  # time, value
+INDEX_STRIDE = 1024  # records between sparse time index entries
+DEFAULT_QUERY_POINTS = 500
+DEFAULT_QUERY_PERIOD = 3600  # seconds queried when no start time is given
+RETENTION_CHECK = 3600  # seconds between checks for expired records
+RETENTION_SLACK = 86400  # seconds of expired records allowed before a file is rewritten
+
+
+class TimeSeries:
+    """
+    A single series: a ring of the most recent samples in RAM and an append-only record file on disk. Samples are
+    appended to the ring immediately and written to the file in batches by flush().
+    """
+    def __init__(self, name, path, ram_samples):
+        self.name = name
+        self._path = os.path.join(path, '%s.ts' % name)
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._map_lock = Lock()
+        self._size = max(int(ram_samples), 1)
+        self._times = array('d', [0.0]) * self._size
+        self._values = array('d', [0.0]) * self._size
+        self._count = 0
+        self._next = 0
+        self._pending = []
+        self._index = []
+        self._map = None
+        self._mapped_records = 0
+        self._last_time = 0.0
+        self._records = self._open_file()
+
+    def _open_file(self):
+        """
+        Opens the record file for appending, drops a partly written last record and builds the sparse time index.
+        Returns the number of records in the file.
+        """
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        self._file = open(self._path, 'ab', buffering=0)  # pylint: disable=consider-using-with
+        size = os.path.getsize(self._path)
+        if size % RECORD.size:
+            self._file.truncate(size - size % RECORD.size)
+            logger.warning('TimeSeries: %s partial record removed', self._path)
+        records = size // RECORD.size
+        if records > 0:
+            with open(self._path, 'rb') as record_file, mmap(record_file.fileno(), 0, access=ACCESS_READ) as records_map:
+                self._index = [RECORD.unpack_from(records_map, position * RECORD.size)[0]
+                               for position in range(0, records, INDEX_STRIDE)]
+                self._last_time = RECORD.unpack_from(records_map, (records - 1) * RECORD.size)[0]
+        return records
+
+    def append(self, timestamp, value):
+        """
+        Adds a sample. Timestamps earlier than the last sample are moved to the time of the last sample so the
+        series always stays in time order.
+        """
+        with self._lock:
+            timestamp = max(timestamp, self._last_time)
+            self._last_time = timestamp
+            self._times[self._next] = timestamp
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self._size
+            self._count = min(self._count + 1, self._size)
+            self._pending.append((timestamp, value))
+            return len(self._pending) >= self._size // 2
+
+    def flush(self):
+        """
+        Writes the samples added since the last flush to the record file and extends the sparse index. The write lock
+        is held from taking the pending samples to updating the index, so concurrent flushes write in time order.
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            self._file.write(b''.join(RECORD.pack(timestamp, value) for timestamp, value in pending))
+            first_record = self._records
+            self._records += len(pending)
+            for record in range(-(-first_record // INDEX_STRIDE) * INDEX_STRIDE, self._records, INDEX_STRIDE):
+                self._index.append(pending[record - first_record][0])
+
+    def expire(self, before, slack=0):
+        """
+        Removes the records older than before from the record file. The file is only rewritten if its oldest record
+        is more than slack seconds older than before, so expired records are removed in batches.
+        """
+        with self._write_lock, self._map_lock:
+            if not self._index or self._index[0] >= before - slack:
+                return
+            with open(self._path, 'rb') as record_file, mmap(record_file.fileno(), 0, access=ACCESS_READ) as records_map:
+                first = self._find(records_map, self._records, before)
+                with open(self._path + '.tmp', 'wb') as new_file:
+                    new_file.write(records_map[first * RECORD.size:self._records * RECORD.size])
+                    new_file.flush()
+                    os.fsync(new_file.fileno())
+            self._file.close()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._mapped_records = 0
+            os.replace(self._path + '.tmp', self._path)
+            self._index = []
+            self._records = self._open_file()
+            logger.info('TimeSeries: %s %s expired records removed', self.name, first)
+
+    def _ring(self):
+        """Returns the times and values in the RAM ring, oldest first."""
+        with self._lock:
+            start = (self._next - self._count) % self._size
+            order = [(start + offset) % self._size for offset in range(self._count)]
+            return [self._times[position] for position in order], [self._values[position] for position in order]
+
+    def _find(self, records_map, records, timestamp):
+        """Returns the number of the first record in the file at or after the timestamp."""
+        block = bisect_left(self._index, timestamp)
+        low = max(block - 1, 0) * INDEX_STRIDE
+        high = min(block * INDEX_STRIDE + 1, records)
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD.unpack_from(records_map, middle * RECORD.size)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _map_range(self, start, end):
+        """
+        Maps the record file again if it has grown and returns the numbers of the first record at or after start and
+        the first record at or after end. Must be called with the map lock held.
+        """
+        records = self._records
+        if records == 0:
+            return 0, 0
+        if records > self._mapped_records:
+            if self._map is not None:
+                self._map.close()
+            with open(self._path, 'rb') as record_file:
+                self._map = mmap(record_file.fileno(), 0, access=ACCESS_READ)
+            self._mapped_records = records
+        return (self._find(self._map, self._mapped_records, start),
+                self._find(self._map, self._mapped_records, end))
+
+    def query(self, start, end, points):
+        """
+        Returns the samples from start up to (not including) end. If there are more than points samples they are
+        downsampled to points equal time buckets of [bucket start, mean, min, max], otherwise the raw [time, value]
+        samples are returned. The file is only read for the part of the range that is older than the RAM ring.
+        """
+        ring_times, ring_values = self._ring()
+        ring_low = bisect_left(ring_times, start)
+        ring_high = bisect_left(ring_times, end)
+        with self._map_lock:
+            file_low, file_high = self._file_range(start, end, ring_times)
+            total = file_high - file_low + ring_high - ring_low
+            samples = Downsampler(start, end, points if total > points else 0)
+            self._add_file_samples(samples, file_low, file_high)
+        for position in range(ring_low, ring_high):
+            samples.add(ring_times[position], ring_values[position])
+        return {'samples': total, 'downsampled': total > points, 'values': samples.result()}
+
+    def _file_range(self, start, end, ring_times):
+        """
+        Returns the numbers of the first and last (exclusive) records in the file for the part of the range from start
+        to end that is older than the RAM ring. Must be called with the map lock held.
+        """
+        ring_start = ring_times[0] if ring_times else float('inf')
+        if start >= ring_start:
+            return 0, 0
+        return self._map_range(start, min(end, ring_start))
+
+    def _add_file_samples(self, samples, file_low, file_high):
+        """Adds the records from file_low up to file_high to the samples. Must be called with the map lock held."""
+        if file_high <= file_low:
+            return
+        view = memoryview(self._map)[file_low * RECORD.size:file_high * RECORD.size]
+        for timestamp, value in RECORD.iter_unpack(view):
+            samples.add(timestamp, value)
+        view.release()
+
+    def records(self, start, end):
+        """
+        Returns the samples from start up to (not including) end as packed records, for analysis of whole ranges with
+        bulk array operations. Only the requested range of the file is copied.
+        """
+        ring_times, ring_values = self._ring()
+        with self._map_lock:
+            file_low, file_high = self._file_range(start, end, ring_times)
+            file_records = self._map[file_low * RECORD.size:file_high * RECORD.size] if file_high > file_low else b''
+        ring_records = b''.join(RECORD.pack(ring_times[position], ring_values[position])
+                                for position in range(bisect_left(ring_times, start), bisect_left(ring_times, end)))
+        return file_records + ring_records
+
+
+class Downsampler:
+    """
+    Collects samples in time order. With buckets set to 0 the samples are kept as they are, otherwise the range from
+    start to end is divided into that many equal buckets and each bucket keeps its mean, minimum and maximum.
+    """
+    def __init__(self, start, end, buckets):
+        self._start = start
+        self._buckets = buckets
+        self._width = (end - start) / buckets if buckets else 0
+        self._result = []
+        self._bucket = -1
+        self._sum = self._count = 0
+        self._min = self._max = 0.0
+
+    def add(self, timestamp, value):
+        """Adds a sample."""
+        if not self._buckets:
+            self._result.append([timestamp, value])
+            return
+        bucket = min(int((timestamp - self._start) / self._width), self._buckets - 1)
+        if bucket != self._bucket:
+            self._close_bucket()
+            self._bucket = bucket
+            self._sum = self._count = 0
+            self._min = self._max = value
+        self._sum += value
+        self._count += 1
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+
+    def _close_bucket(self):
+        if self._count:
+            self._result.append([self._start + self._bucket * self._width, self._sum / self._count,
+                                 self._min, self._max])
+
+    def result(self):
+        """Returns the collected samples or buckets."""
+        self._close_bucket()
+        self._count = 0
+        return self._result
+
+
+class TimeSeriesStore:
+    """
+    Holds the series of the application. Series are created the first time a value is recorded for them. A recorder
+    job samples the registered sources at the history interval and wakes the writer thread, which flushes every
+    series to disk and removes expired records when the hourly retention job asks for it.
+    """
+    def __init__(self, path, ram_samples, interval, retention_days=0):
+        self._path = path
+        self._ram_samples = ram_samples
+        self._series = {}
+        self._sources = {}
+        self._lock = Lock()
+        for file_name in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+            if file_name.endswith('.ts'):
+                self.series(file_name[:-3])
+        self._write_due = Event()
+        self._expire_due = False
+        writer_thread = Thread(target=self._writer, daemon=True)
+        writer_thread.name = 'History writer'
+        writer_thread.start()
+        self._recorder = scheduler.call_every(interval, self.recorder)
+        self._retention = retention_days * 86400
+        if self._retention > 0:
+            scheduler.call_every(RETENTION_CHECK, self.request_expire, delay=0)
+        atexit.register(self.flush)
+
+    def series(self, name):
+        """Returns the named series, creating it if it does not exist yet."""
+        with self._lock:
+            if name not in self._series:
+                self._series[name] = TimeSeries(name, self._path, self._ram_samples)
+            return self._series[name]
+
+    def record(self, name, value, timestamp=None):
+        """Adds a value to the named series, at the current time if no timestamp is given."""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if self.series(name).append(timestamp or time(), value):
+            self._write_due.set()
+
+    def records(self, name, start, end):
+        """Returns the packed records of the named series from start up to end, empty if the series does not exist."""
+        if name not in self._series:
+            return b''
+        return self._series[name].records(start, end)
+
+    def register_source(self, name, function):
+        """Registers a function that returns the current value of a series, sampled every history interval."""
+        self._sources[name] = function
+
+    def unregister_source(self, name):
+        """Stops sampling a registered source, the recorded series is kept."""
+        self._sources.pop(name, None)
+
+    def recorder(self):
+        """Samples the registered sources and wakes the writer, run every history interval."""
+        sample_time = time()
+        for name, function in list(self._sources.items()):
+            try:
+                self.record(name, function(), sample_time)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception('TimeSeries: history source %s failed', name)
+        self._write_due.set()
+
+    def request_expire(self):
+        """Asks the writer to remove expired records, run every RETENTION_CHECK."""
+        self._expire_due = True
+        self._write_due.set()
+
+    def _writer(self):
+        """Writes the pending samples each time the writer is woken, and removes expired records when asked."""
+        while True:
+            self._write_due.wait()
+            self._write_due.clear()
+            self.flush()
+            if self._expire_due:
+                self._expire_due = False
+                self.expire()
+
+    def flush(self):
+        """Writes all pending samples to disk."""
+        for series in list(self._series.values()):
+            try:
+                series.flush()
+            except OSError:
+                logger.exception('TimeSeries: writing history for %s failed', series.name)
+
+    def expire(self):
+        """Removes the records older than the retention period from every series."""
+        before = time() - self._retention
+        for series in list(self._series.values()):
+            try:
+                series.expire(before, RETENTION_SLACK)
+            except OSError:
+                logger.exception('TimeSeries: expiring history for %s failed', series.name)
+
+    def query(self, item, command):
+        """
+        API handler for history queries. The command is a dictionary with the optional keys 'series' (a name or a
+        list of names, default all), 'start' and 'end' (unix timestamps, default the last hour) and 'points' (the
+        maximum samples returned per series, default 500).
+        """
+        if not isinstance(command, dict):
+            command = {}
+        end = float(command.get('end') or time())
+        start = float(command.get('start') or end - DEFAULT_QUERY_PERIOD)
+        points = max(int(command.get('points') or DEFAULT_QUERY_POINTS), 1)
+        names = command.get('series') or sorted(self._series)
+        if isinstance(names, str):
+            names = [names]
+        unknown = [name for name in names if name not in self._series]
+        values = {name: self._series[name].query(start, end, points) for name in names if name in self._series}
+        if unknown:
+            return {'item': item, 'command': command, 'values': values,
+                    'exception': 'Unknown series %s' % ', '.join(unknown)}
+        return {'item': item, 'command': command, 'values': values}
+
+
+history = TimeSeriesStore(settings['history_path'], settings['history_ram_samples'], settings['history_interval'],
+                          settings['history_retention_days'])